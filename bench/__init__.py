@@ -0,0 +1,5 @@
+"""
+Нагрузочные замеры основных страниц на синтетическом каталоге (SQLite, без MySQL).
+
+Запуск: ``python -m bench --books 100000 --reviews 1000000 --users 10000``.
+"""
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import Config
+from elib import create_app, db
+
+from .dataset import MODERATOR, PASSWORD, DatasetSize, generate
+
+_SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+# Сценарий: (имя, от чьего лица, функция rng -> URL).
+Scenario = Tuple[str, Optional[str], Callable[[random.Random], str]]
+
+
+def _bench_config(db_path: Path, covers_dir: Path) -> type:
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        COVERS_DIR = str(covers_dir)
+        # Счётчик запросов к БД берём из заголовка Server-Timing.
+        SQL_TRACE_ENABLED = True
+
+    return BenchConfig
+
+
+def _sqlite_pragmas(dbapi_con, _record) -> None:
+    cursor = dbapi_con.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.close()
+
+
+def _prepare_db(app, size: DatasetSize, db_path: Path, log: Callable[[str], None]) -> Dict[str, object]:
+    """База с данными нужного размера; готовая база с теми же параметрами переиспользуется."""
+    meta_path = db_path.with_name(db_path.name + ".json")
+    if db_path.exists() and meta_path.exists():
+        if json.loads(meta_path.read_text()) == size.as_dict():
+            log(f"reusing dataset {db_path}")
+            return {"reused": True}
+    for path in (db_path, meta_path):
+        if path.exists():
+            path.unlink()
+
+    with app.app_context():
+        started = time.perf_counter()
+        db.create_all()
+        timings = generate(size, progress=log)
+    meta_path.write_text(json.dumps(size.as_dict()))
+    return {"reused": False, "seconds": round(time.perf_counter() - started, 1), "stages": timings}
+
+
+def _scenarios(size: DatasetSize, max_pages: int) -> List[Scenario]:
+    def index(rng):
+        return f"/?page={rng.randint(1, max_pages)}"
+
+    def index_filtered(rng):
+        return f"/?genre={rng.randint(1, size.genres)}&year_from={rng.randint(1900, 2000)}&year_to=2024"
+
+    def book_view(rng):
+        return f"/books/{rng.randint(1, size.books)}"
+
+    def moderation_queue(rng):
+        return f"/moderation/reviews?page={rng.randint(1, max_pages)}"
+
+    def my_reviews(_rng):
+        return "/my/reviews"
+
+    return [
+        ("books.index", None, index),
+        ("books.index (filtered)", None, index_filtered),
+        ("books.book_view", None, book_view),
+        ("reviews.moderation_queue", MODERATOR, moderation_queue),
+        ("reviews.my_reviews", "user", my_reviews),
+    ]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _login(app, username: str):
+    client = app.test_client()
+    response = client.post("/login", data={"username": username, "password": PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f"login as {username!r} failed: HTTP {response.status_code}")
+    return client
+
+
+def _run_scenario(app, scenario: Scenario, size: DatasetSize, rng: random.Random,
+                  requests: int, warmup: int) -> Dict[str, object]:
+    name, user, make_url = scenario
+    if user is None:
+        clients = [app.test_client()]
+    elif user == "user":
+        # Несколько обычных пользователей, чтобы «мои рецензии» не были одной страницей.
+        clients = [_login(app, f"user{rng.randint(3, max(3, size.users))}") for _ in range(8)]
+    else:
+        clients = [_login(app, user)]
+
+    latencies: List[float] = []
+    queries: List[int] = []
+    db_ms: List[float] = []
+    statuses: Dict[str, int] = {}
+    for i in range(warmup + requests):
+        client = clients[i % len(clients)]
+        url = make_url(rng)
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = (time.perf_counter() - started) * 1000
+        response.close()
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        match = _SERVER_TIMING_RE.search(response.headers.get("Server-Timing", ""))
+        if match:
+            db_ms.append(float(match.group(1)))
+            queries.append(int(match.group(2)))
+
+    return {
+        "requests": requests,
+        "status": statuses,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "max_queries": max(queries) if queries else None,
+        "db_p50_ms": round(_percentile(db_ms, 50), 2) if db_ms else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Замеры страниц на синтетическом каталоге.")
+    parser.add_argument("--books", type=int, default=DatasetSize.books)
+    parser.add_argument("--reviews", type=int, default=DatasetSize.reviews)
+    parser.add_argument("--users", type=int, default=DatasetSize.users)
+    parser.add_argument("--genres", type=int, default=DatasetSize.genres)
+    parser.add_argument("--seed", type=int, default=DatasetSize.seed)
+    parser.add_argument("--db", type=Path, default=None,
+                        help="файл SQLite; если с теми же параметрами уже есть — переиспользуется")
+    parser.add_argument("--requests", type=int, default=200, help="замеряемых запросов на сценарий")
+    parser.add_argument("--warmup", type=int, default=20, help="незамеряемых запросов перед замером")
+    parser.add_argument("--only", action="append", default=[], help="только сценарии с этим префиксом")
+    parser.add_argument("--output", type=Path, default=None, help="куда записать JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    size = DatasetSize(books=args.books, reviews=args.reviews, users=args.users,
+                       genres=args.genres, seed=args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="elib-bench-"))
+    db_path = (args.db or workdir / "bench.db").resolve()
+    covers_dir = workdir / "covers"
+    covers_dir.mkdir()
+
+    def log(message: str) -> None:
+        print(message, file=sys.stderr, flush=True)
+
+    app = create_app(_bench_config(db_path, covers_dir))
+    app.logger.setLevel(logging.ERROR)
+    with app.app_context():
+        event.listen(db.engine, "connect", _sqlite_pragmas)
+
+    dataset = _prepare_db(app, size, db_path, log)
+
+    rng = random.Random(size.seed)
+    results = {}
+    for scenario in _scenarios(size, app.config.get("MAX_NUMBERED_PAGES", 20)):
+        name = scenario[0]
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        log(f"running {name} ...")
+        results[name] = _run_scenario(app, scenario, size, rng, args.requests, args.warmup)
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": size.as_dict(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+        },
+        "dataset": dataset,
+        "endpoints": results,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import insert
+
+from elib import db
+from elib.models import (
+    Book,
+    BookGenre,
+    Cover,
+    DataVersion,
+    Genre,
+    Review,
+    ReviewStatus,
+    Role,
+    User,
+)
+from elib.security import generate_password_hash
+from elib.stats import rebuild_book_stats
+from elib.utils import markdown_renderer_version, markdown_to_html_safe
+
+PASSWORD = "qwerty"
+ADMIN = "admin"
+MODERATOR = "moder"
+
+BATCH_SIZE = 5000
+
+_GENRES = [
+    "Фантастика", "Детектив", "Роман", "Фэнтези", "Поэзия", "История", "Биография",
+    "Приключения", "Психология", "Научпоп", "Драма", "Триллер", "Ужасы", "Юмор",
+    "Философия", "Классика", "Сказки", "Мемуары", "Бизнес", "Программирование",
+]
+_WORDS = [
+    "тень", "город", "ветер", "море", "звезда", "дорога", "память", "сад", "огонь", "зеркало",
+    "север", "остров", "ночь", "песня", "время", "камень", "река", "свет", "лес", "дом",
+    "последний", "тихий", "дальний", "забытый", "красный", "белый", "старый", "новый",
+    "хроники", "история", "тайна", "возвращение", "письма", "записки", "путь", "сердце",
+]
+_LAST_NAMES = [
+    "Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов",
+    "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов",
+    "Егоров", "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров",
+]
+_FIRST_NAMES = ["Анна", "Иван", "Мария", "Пётр", "Ольга", "Сергей", "Елена", "Алексей", "Юлия", "Дмитрий"]
+_PUBLISHERS = ["АСТ", "Эксмо", "Азбука", "Махаон", "Питер", "Альпина", "Росмэн", "Речь", "Дрофа", "Вече"]
+
+
+@dataclass(frozen=True)
+class DatasetSize:
+    books: int = 10_000
+    reviews: int = 100_000
+    users: int = 1_000
+    genres: int = 12
+    seed: int = 1
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def _batched(rows: Iterator[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(model, rows: Iterator[dict]) -> int:
+    # Core insert со списком словарей — один executemany на пачку, без ORM-объектов.
+    total = 0
+    for batch in _batched(rows):
+        db.session.execute(insert(model), batch)
+        total += len(batch)
+    return total
+
+
+def _title(rng: random.Random) -> str:
+    words = rng.sample(_WORDS, rng.randint(1, 4))
+    return " ".join(words).capitalize()
+
+
+def _person(rng: random.Random) -> str:
+    return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+
+
+def _texts(rng: random.Random, n: int, sentences: int) -> List[dict]:
+    # Небольшой набор текстов с уже сохранённым HTML — как после `flask markdown backfill`.
+    version = markdown_renderer_version()
+    texts = []
+    for _ in range(n):
+        text = "\n\n".join(
+            f"{_title(rng)} — **{rng.choice(_WORDS)}** и {rng.choice(_WORDS)}." for _ in range(sentences)
+        )
+        texts.append({"text": text, "html": markdown_to_html_safe(text), "version": version})
+    return texts
+
+
+def generate(size: DatasetSize, progress: Optional[Callable[[str], None]] = None) -> Dict[str, float]:
+    """
+    Заполнить пустую схему синтетическими данными заданного размера.
+
+    Всё детерминировано ``size.seed``: одинаковые параметры дают одинаковую базу,
+    поэтому замеры разных коммитов сравнимы. Возвращает время этапов в секундах.
+    """
+    if size.reviews > size.books * size.users:
+        raise ValueError("Рецензий не может быть больше, чем пар (книга, пользователь).")
+
+    rng = random.Random(size.seed)
+    report = progress or (lambda _msg: None)
+    timings: Dict[str, float] = {}
+
+    def stage(name: str, fn: Callable[[], int]) -> None:
+        started = time.perf_counter()
+        count = fn()
+        db.session.commit()
+        timings[name] = round(time.perf_counter() - started, 3)
+        report(f"{name}: {count} rows in {timings[name]:.1f}s")
+
+    roles = {"Admin": 1, "Moderator": 2, "User": 3}
+    statuses = {ReviewStatus.PENDING: 1, ReviewStatus.APPROVED: 2, ReviewStatus.REJECTED: 3}
+
+    def refdata() -> int:
+        _insert(Role, ({"id": i, "name": n, "description": n} for n, i in roles.items()))
+        _insert(ReviewStatus, ({"id": i, "name": n} for n, i in statuses.items()))
+        _insert(Genre, ({"id": i + 1, "name": n} for i, n in enumerate(_GENRES[: size.genres])))
+        versions = (DataVersion.REFDATA, DataVersion.CATALOGUE, DataVersion.PRINCIPALS)
+        _insert(DataVersion, ({"name": n, "version": 1} for n in versions))
+        return len(roles) + len(statuses) + size.genres
+
+    def users() -> int:
+        password_hash = generate_password_hash(PASSWORD)
+
+        def rows():
+            yield {"id": 1, "username": ADMIN, "password_hash": password_hash,
+                   "last_name": "Админ", "first_name": "Админ", "role_id": roles["Admin"]}
+            yield {"id": 2, "username": MODERATOR, "password_hash": password_hash,
+                   "last_name": "Модератор", "first_name": "Модератор", "role_id": roles["Moderator"]}
+            for i in range(3, size.users + 1):
+                yield {"id": i, "username": f"user{i}", "password_hash": password_hash,
+                       "last_name": rng.choice(_LAST_NAMES), "first_name": rng.choice(_FIRST_NAMES),
+                       "role_id": roles["User"]}
+
+        return _insert(User, rows())
+
+    def books() -> int:
+        descriptions = _texts(rng, 64, 3)
+        authors = [_person(rng) for _ in range(max(1, size.books // 8))]
+
+        def covers():
+            for i in range(1, size.books + 1):
+                yield {"id": i, "filename": f"{i}.jpg", "mime_type": "image/jpeg",
+                       "md5": hashlib.md5(str(i).encode()).hexdigest()}
+
+        def book_rows():
+            for i in range(1, size.books + 1):
+                desc = rng.choice(descriptions)
+                yield {"id": i, "title": _title(rng), "author": rng.choice(authors),
+                       "publisher": rng.choice(_PUBLISHERS), "year": rng.randint(1900, 2024),
+                       "pages": rng.randint(50, 900), "cover_id": i,
+                       "short_description": desc["text"], "short_description_html": desc["html"],
+                       "short_description_render_version": desc["version"]}
+
+        def genre_rows():
+            for i in range(1, size.books + 1):
+                for genre_id in rng.sample(range(1, size.genres + 1), rng.randint(1, min(3, size.genres))):
+                    yield {"book_id": i, "genre_id": genre_id}
+
+        _insert(Cover, covers())
+        count = _insert(Book, book_rows())
+        _insert(BookGenre, genre_rows())
+        return count
+
+    def reviews() -> int:
+        texts = _texts(rng, 256, 2)
+        start = datetime(2022, 1, 1)
+        span = int(timedelta(days=3 * 365).total_seconds())
+        weights = [statuses[ReviewStatus.APPROVED]] * 7 + [statuses[ReviewStatus.PENDING]] * 2 \
+            + [statuses[ReviewStatus.REJECTED]]
+        # Перестановка пользователей: у каждой книги свой сдвиг, пары (книга, пользователь)
+        # не повторяются, пока на книгу приходится не больше size.users рецензий.
+        user_ids = list(range(1, size.users + 1))
+        rng.shuffle(user_ids)
+
+        def rows():
+            for i in range(size.reviews):
+                book_id = i % size.books + 1
+                round_no = i // size.books
+                text = rng.choice(texts)
+                yield {"book_id": book_id,
+                       "user_id": user_ids[(book_id * 7919 + round_no) % size.users],
+                       "rating": rng.randint(0, 5), "status_id": rng.choice(weights),
+                       "created_at": start + timedelta(seconds=rng.randrange(span)),
+                       "text": text["text"], "text_html": text["html"], "text_render_version": text["version"]}
+
+        return _insert(Review, rows())
+
+    stage("refdata", refdata)
+    stage("users", users)
+    stage("books", books)
+    stage("reviews", reviews)
+    stage("book_stats", rebuild_book_stats)
+    return timings
@@ -50,15 +50,64 @@ class Config:
     SQLALCHEMY_DATABASE_URI = _env_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Реплики только для чтения (DATABASE_REPLICA_URLS через запятую): с них читают
+    # GET-страницы каталога и рецензий. Пусто — всё идёт на основную БД.
+    SQLALCHEMY_REPLICA_URLS = [
+        url for url in (_normalize_mysql_url(u.strip()) for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",")) if url
+    ]
+    # Сколько секунд после POST клиент читает с основной БД, чтобы видеть свои изменения.
+    REPLICA_READ_AFTER_WRITE = float(os.getenv("REPLICA_READ_AFTER_WRITE", "5"))
+    # Как часто (сек.) проверять доступность реплик; недоступные заменяются основной БД.
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "10"))
+
     PAGE_SIZE = int(os.getenv("PAGE_SIZE", "10"))
+    REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "20"))
+    # Дальше этой страницы каталог листается курсором (?after=/?before=), а не OFFSET.
+    MAX_NUMBERED_PAGES = int(os.getenv("MAX_NUMBERED_PAGES", "20"))
+    # Размер страницы JSON API по умолчанию и верхняя граница ?limit=.
+    API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "20"))
+    API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "100"))
+
+    # Как часто (сек.) закэшированные итоги для пагинации сверяются с БД.
+    COUNTER_CACHE_TTL = float(os.getenv("COUNTER_CACHE_TTL", "60"))
+    # Как часто (сек.) проверять версию справочников (статусы, роли, жанры).
+    REFDATA_CHECK_INTERVAL = float(os.getenv("REFDATA_CHECK_INTERVAL", "30"))
+    # Как часто (сек.) индексы каталога в памяти (поиск) сверяют версию каталога.
+    CATALOGUE_CHECK_INTERVAL = float(os.getenv("CATALOGUE_CHECK_INTERVAL", "30"))
+    # "auto" — MySQL FULLTEXT на MySQL, иначе индекс в памяти; можно явно "mysql"/"memory".
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+    # Кэш пользователя с ролью для user_loader (сек.); 0 — выключен.
+    PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "0"))
+    # Как часто (сек.) кэш пользователей сверяет версию, которую повышают изменения пользователей и ролей.
+    PRINCIPAL_CHECK_INTERVAL = float(os.getenv("PRINCIPAL_CHECK_INTERVAL", "5"))
+
+    # Учёт SQL по запросам: заголовок Server-Timing и строка лога с итогами.
+    SQL_TRACE_ENABLED = os.getenv("SQL_TRACE_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Сколько самых медленных запросов попадает в лог.
+    SQL_TRACE_SLOWEST = int(os.getenv("SQL_TRACE_SLOWEST", "3"))
+    # С какого числа повторов одной формы запроса считать это N+1.
+    SQL_TRACE_N_PLUS_ONE = int(os.getenv("SQL_TRACE_N_PLUS_ONE", "5"))
 
     COVERS_DIR = os.getenv("COVERS_DIR", str(_DEFAULT_COVERS))
     STATIC_FOLDER = str(STATIC_DIR)
+    # Раскладка новых файлов обложек: "sharded" (ab/cd/<id>.<ext>) или "flat".
+    # Существующие файлы переносит `flask covers relayout`.
+    COVER_STORAGE = os.getenv("COVER_STORAGE", "sharded")
 
     ALLOWED_COVER_MIME = {"image/jpeg", "image/png", "image/webp"}
+    # Обложки отдаются по адресам с MD5, поэтому кэшируются «навсегда».
+    COVER_CACHE_MAX_AGE = int(os.getenv("COVER_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+    # Префикс internal-location nginx для X-Accel-Redirect; пусто — файл отдаёт Flask.
+    COVERS_ACCEL_REDIRECT = os.getenv("COVERS_ACCEL_REDIRECT") or None
+    COVER_VARIANT_WORKERS = int(os.getenv("COVER_VARIANT_WORKERS", "2"))
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024
 
+    # Сколько рецензий модератор берёт в работу за раз и на сколько секунд.
+    MODERATION_CLAIM_BATCH = int(os.getenv("MODERATION_CLAIM_BATCH", "10"))
+    MODERATION_LEASE_SECONDS = int(os.getenv("MODERATION_LEASE_SECONDS", "900"))
+
     MARKDOWN_EXTENSIONS = ["extra", "sane_lists", "nl2br"]
+    MARKDOWN_CACHE_SIZE = int(os.getenv("MARKDOWN_CACHE_SIZE", "2048"))
 
     NH3_ALLOWED_TAGS = None
     NH3_ALLOWED_ATTRS = None
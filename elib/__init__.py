@@ -3,8 +3,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import Config
+from .replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
@@ -16,21 +17,57 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     app = Flask(__name__, static_folder=config_class.STATIC_FOLDER)
     app.config.from_object(config_class)
 
+    from .replicas import replicas
+    replicas.init_app(app)  # до db.init_app: реплики — дополнительные binds
+
     db.init_app(app)
+
+    from .sqltrace import sql_tracer
+    sql_tracer.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
 
     from .filters import register_filters
     register_filters(app)
 
+    from .utils import markdown_cache
+    markdown_cache.init_app(app)
+
+    from .commands import register_commands
+    register_commands(app)
+
     from . import models
 
+    from .counters import counters
+    counters.init_app(app)
+
+    from .refdata import refdata
+    refdata.init_app(app)
+
+    from .principals import principals
+    principals.init_app(app)
+
+    from .search import search_index
+    search_index.init_app(app)
+
+    from .facets import facet_index
+    facet_index.init_app(app)
+
+    from .suggest import suggest_index
+    suggest_index.init_app(app)
+
     from .auth import auth_bp
     from .books import books_bp
     from .reviews import reviews_bp
+    from .covers import covers_bp
+    from .exports import exports_bp
+    from .api import api_bp
     app.register_blueprint(auth_bp)
     app.register_blueprint(books_bp)
     app.register_blueprint(reviews_bp)
+    app.register_blueprint(covers_bp)
+    app.register_blueprint(exports_bp)
+    app.register_blueprint(api_bp)
 
 
     @app.context_processor
@@ -55,8 +92,11 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     @app.errorhandler(404)
     def not_found(_e):
         p = request.path or ""
-        if p == "/favicon.ico" or p.startswith("/static/"):
+        if p == "/favicon.ico" or p.startswith(("/static/", "/covers/")):
             return ("", 404)
+        if p.startswith("/api/"):
+            from flask import jsonify
+            return jsonify({"error": "Not found."}), 404
         return render_template("404.html"), 404
 
     @app.errorhandler(413)
@@ -70,8 +110,9 @@ def create_app(config_class: type[Config] = Config) -> Flask:
 
 @login_manager.user_loader
 def load_user(user_id: str):
-    from .models import User
+    from .principals import load_principal
     if not user_id:
         return None
-    return db.session.get(User, int(user_id))
+    return load_principal(int(user_id))
+
 
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy import and_, desc, func, or_, select
+
+from . import db
+from .catalogue import catalogue_version
+from .covers import cover_url
+from .models import Book, BookGenre, BookStats, Cover, Review, ReviewStatus, User
+from .refdata import refdata
+from .replicas import prefer_replica
+from .reviews import approved_reviews_where, review_cursor
+from .search import BookQuery
+from .utils import decode_cursor, encode_cursor, markdown_renderer_version, stored_markdown_html
+
+API_VERSION = "v1"
+
+api_bp = Blueprint("api", __name__, url_prefix=f"/api/{API_VERSION}")
+
+
+@dataclass(frozen=True)
+class ApiField:
+    """Поле ответа: какие столбцы выбрать и как получить значение из строки."""
+
+    columns: Tuple = ()
+    value: Optional[Callable] = None
+    join: Optional[str] = None
+    # Значение зависит от рецензий, а не только от версии каталога.
+    volatile: bool = False
+
+
+@dataclass(frozen=True)
+class _CoverRef:
+    id: int
+    md5: str
+    filename: str
+
+
+def _plain(column) -> ApiField:
+    return ApiField(columns=(column,), value=lambda row, key=column.key: getattr(row, key))
+
+
+def _rating(row) -> Optional[float]:
+    return round(row.approved_rating_sum / row.approved_count, 2) if row.approved_count else None
+
+
+BOOK_FIELDS: Dict[str, ApiField] = {
+    "id": _plain(Book.id),
+    "title": _plain(Book.title),
+    "author": _plain(Book.author),
+    "publisher": _plain(Book.publisher),
+    "year": _plain(Book.year),
+    "pages": _plain(Book.pages),
+    "description": _plain(Book.short_description),
+    "description_html": ApiField(
+        columns=(Book.short_description, Book.short_description_html, Book.short_description_render_version),
+        value=lambda row: stored_markdown_html(
+            row.short_description, row.short_description_html, row.short_description_render_version
+        ),
+    ),
+    "cover_url": ApiField(
+        columns=(Cover.id.label("cover_id"), Cover.md5.label("cover_md5"), Cover.filename.label("cover_filename")),
+        value=lambda row: cover_url(_CoverRef(row.cover_id, row.cover_md5, row.cover_filename)),
+        join="cover",
+    ),
+    "reviews_count": ApiField(
+        columns=(func.coalesce(BookStats.approved_count, 0).label("approved_count"),),
+        value=lambda row: row.approved_count,
+        join="stats",
+        volatile=True,
+    ),
+    "rating": ApiField(
+        columns=(
+            func.coalesce(BookStats.approved_count, 0).label("approved_count"),
+            func.coalesce(BookStats.approved_rating_sum, 0).label("approved_rating_sum"),
+        ),
+        value=_rating,
+        join="stats",
+        volatile=True,
+    ),
+    # Жанры — отдельным запросом по id страницы.
+    "genres": ApiField(),
+}
+LIST_FIELDS = ("id", "title", "author", "year", "genres", "cover_url", "rating", "reviews_count")
+DETAIL_FIELDS = tuple(BOOK_FIELDS)
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# API только читает — все его запросы можно отправлять на реплики.
+api_bp.before_request(prefer_replica)
+
+
+@api_bp.errorhandler(ApiError)
+def _api_error(exc: ApiError):
+    return jsonify({"error": exc.message}), exc.status
+
+
+def _parse_fields(default: Sequence[str]) -> List[str]:
+    raw = request.args.get("fields")
+    if not raw:
+        return list(default)
+    fields = []
+    for name in raw.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in BOOK_FIELDS:
+            raise ApiError(400, f"Unknown field: {name!r}. Available: {', '.join(BOOK_FIELDS)}.")
+        if name not in fields:
+            fields.append(name)
+    return fields or list(default)
+
+
+def _parse_limit(default: int, maximum: int) -> int:
+    raw = request.args.get("limit")
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError(400, "limit must be an integer.") from None
+    return max(1, min(limit, maximum))
+
+
+def _book_select(fields: Sequence[str]):
+    columns = {"id": Book.id, "year": Book.year}
+    joins = set()
+    for name in fields:
+        spec = BOOK_FIELDS[name]
+        for column in spec.columns:
+            columns.setdefault(column.key, column)
+        if spec.join:
+            joins.add(spec.join)
+
+    stmt = select(*columns.values())
+    if "cover" in joins:
+        stmt = stmt.join(Cover, Cover.id == Book.cover_id)
+    if "stats" in joins:
+        stmt = stmt.outerjoin(BookStats, BookStats.book_id == Book.id)
+    return stmt
+
+
+def _genres_by_book(book_ids: List[int]) -> Dict[int, List[dict]]:
+    names = {g.id: g.name for g in refdata.genres()}
+    result: Dict[int, List[dict]] = defaultdict(list)
+    if not book_ids:
+        return result
+    rows = db.session.execute(
+        select(BookGenre.book_id, BookGenre.genre_id)
+        .where(BookGenre.book_id.in_(book_ids))
+        .order_by(BookGenre.book_id, BookGenre.genre_id)
+    )
+    for book_id, genre_id in rows:
+        result[book_id].append({"id": genre_id, "name": names.get(genre_id)})
+    return result
+
+
+def _serialize_books(rows, fields: Sequence[str]) -> List[dict]:
+    genres = _genres_by_book([row.id for row in rows]) if "genres" in fields else {}
+    items = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            item[name] = genres.get(row.id, []) if name == "genres" else BOOK_FIELDS[name].value(row)
+        items.append(item)
+    return items
+
+
+def _etag(*parts) -> str:
+    # Кроме данных ответ зависит от названий жанров (справочники) и от рендера Markdown
+    # (description_html, text_html) — их версии входят в каждый ETag.
+    versions = (API_VERSION, refdata.version(), markdown_renderer_version())
+    return hashlib.md5(repr(versions + parts).encode("utf-8")).hexdigest()
+
+
+def _not_modified(etag: str) -> Optional[Response]:
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        _set_validators(response, etag)
+        return response
+    return None
+
+
+def _set_validators(response: Response, etag: str) -> None:
+    response.set_etag(etag)
+    # Кэшировать можно, но перед использованием — сверять ETag.
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+
+
+@api_bp.get("/books")
+def book_list():
+    """
+    Каталог по ключу (год desc, id desc), как на главной. Фильтры ``genre``, ``year_from``,
+    ``year_to``; ``cursor`` — из ``next_cursor`` предыдущего ответа; ``fields`` — список полей.
+    """
+    fields = _parse_fields(LIST_FIELDS)
+    limit = _parse_limit(
+        current_app.config.get("API_PAGE_SIZE", 20), current_app.config.get("API_MAX_PAGE_SIZE", 100)
+    )
+    query = BookQuery.from_args(request.args)
+    raw_cursor = request.args.get("cursor")
+    after = decode_cursor(raw_cursor, 2)
+    if raw_cursor and not after:
+        raise ApiError(400, "Invalid cursor.")
+
+    version = catalogue_version()
+    volatile = any(BOOK_FIELDS[name].volatile for name in fields)
+    request_key = (version, tuple(fields), limit, query.genre_ids, query.year_from, query.year_to, after)
+    if not volatile:
+        # Ответ целиком определяется версией каталога — 304 без единого запроса к книгам.
+        etag = _etag("books", *request_key)
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+    stmt = _book_select(fields).where(*query.where_clauses())
+    if after:
+        year, book_id = after
+        stmt = stmt.where(or_(Book.year < year, and_(Book.year == year, Book.id < book_id)))
+    rows = db.session.execute(stmt.order_by(desc(Book.year), desc(Book.id)).limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].year, rows[limit - 1].id) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    if volatile:
+        stats = tuple((row.id, getattr(row, "approved_count", None), getattr(row, "approved_rating_sum", None))
+                      for row in rows)
+        etag = _etag("books", *request_key, stats)
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+    response = jsonify({"items": _serialize_books(rows, fields), "next_cursor": next_cursor})
+    _set_validators(response, etag)
+    return response
+
+
+def _approved_reviews(book_id: int, after: Optional[Tuple[int, ...]]) -> Tuple[List[dict], Optional[str]]:
+    approved_id = refdata.status_id(ReviewStatus.APPROVED)
+    if not approved_id:
+        return [], None
+    page_size = current_app.config.get("REVIEWS_PAGE_SIZE", 20)
+    rows = db.session.execute(
+        select(
+            Review.id, Review.rating, Review.created_at,
+            Review.text, Review.text_html, Review.text_render_version,
+            User.last_name, User.first_name, User.middle_name,
+        )
+        .join(User, User.id == Review.user_id)
+        .where(*approved_reviews_where(book_id, approved_id, after))
+        .order_by(desc(Review.created_at), desc(Review.id))
+        .limit(page_size + 1)
+    ).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = review_cursor(rows[-1].created_at, rows[-1].id)
+    items = [
+        {
+            "id": row.id,
+            "rating": row.rating,
+            "created_at": row.created_at.isoformat(),
+            "author": " ".join(p for p in (row.last_name, row.first_name, row.middle_name) if p),
+            "text_html": stored_markdown_html(row.text, row.text_html, row.text_render_version),
+        }
+        for row in rows
+    ]
+    return items, next_cursor
+
+
+def _reviews_validator(book_id: int) -> Optional[tuple]:
+    """
+    Всё, от чего зависят одобренные рецензии книги, одним запросом; None — книги нет.
+    """
+    approved_id = refdata.status_id(ReviewStatus.APPROVED) or 0
+    last_approved = (
+        select(func.max(Review.id))
+        .where(Review.book_id == Book.id, Review.status_id == approved_id)
+        .scalar_subquery()
+    )
+    row = db.session.execute(
+        select(Book.id, BookStats.approved_count, BookStats.approved_rating_sum, last_approved)
+        .outerjoin(BookStats, BookStats.book_id == Book.id)
+        .where(Book.id == book_id)
+    ).first()
+    return tuple(row) if row else None
+
+
+@api_bp.get("/books/<int:book_id>")
+def book_detail(book_id: int):
+    """Книга с первой страницей одобренных рецензий (``reviews_next_cursor`` — для продолжения)."""
+    fields = _parse_fields(DETAIL_FIELDS)
+    validator = _reviews_validator(book_id)
+    if validator is None:
+        raise ApiError(404, "Book not found.")
+
+    etag = _etag("book", catalogue_version(), tuple(fields), validator)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    row = db.session.execute(_book_select(fields).where(Book.id == book_id)).first()
+    if row is None:
+        raise ApiError(404, "Book not found.")
+    item = _serialize_books([row], fields)[0]
+    item["reviews"], item["reviews_next_cursor"] = _approved_reviews(book_id, None)
+
+    response = jsonify(item)
+    _set_validators(response, etag)
+    return response
+
+
+@api_bp.get("/books/<int:book_id>/reviews")
+def book_reviews(book_id: int):
+    """Следующие страницы одобренных рецензий книги: ``cursor`` из предыдущего ответа."""
+    raw_cursor = request.args.get("cursor")
+    after = decode_cursor(raw_cursor, 2)
+    if raw_cursor and not after:
+        raise ApiError(400, "Invalid cursor.")
+    validator = _reviews_validator(book_id)
+    if validator is None:
+        raise ApiError(404, "Book not found.")
+
+    etag = _etag("reviews", validator, after)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    items, next_cursor = _approved_reviews(book_id, after)
+    response = jsonify({"items": items, "next_cursor": next_cursor})
+    _set_validators(response, etag)
+    return response
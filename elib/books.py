@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from flask import (
     Blueprint,
@@ -10,64 +10,166 @@ from flask import (
     url_for,
     flash,
     current_app,
+    jsonify,
 )
 from flask_login import current_user
-from sqlalchemy import select, func, desc
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, func, desc, or_, and_
+from sqlalchemy.orm import joinedload, selectinload
 
 from . import db
-from .models import Book, Genre, BookGenre, Cover, Review
+from .models import Book, BookGenre, Cover
 from .decorators import roles_required, role_required
+from .stats import create_book_stats
+from .counters import counters, book_total, BOOKS_TOTAL
+from .refdata import refdata
+from .catalogue import bump_catalogue_version, books_changed
+from .search import BookQuery, search_books
+from .facets import catalogue_facets, facet_index
+from .suggest import suggest_index
+from .covers import remove_cover_files, schedule_cover_removal, schedule_cover_variants
+from .reviews import approved_reviews_page, find_user_review
+from .replicas import reads_from_replica
 from .utils import (
     parse_page_arg,
-    calc_md5,
-    save_cover_file,
-    remove_cover_file,
-    markdown_to_html_safe,
+    encode_cursor,
+    decode_cursor,
+    ingest_cover_upload,
+    commit_cover_file,
+    discard_upload,
+    render_markdown_for_storage,
+    stored_markdown_html,
 )
 
 books_bp = Blueprint("books", __name__)
 
 
-@books_bp.get("/")
-def index():
-    page = parse_page_arg(request.args.get("page"), default=1)
-    page_size = current_app.config.get("PAGE_SIZE", 10)
-
-    q = (
+def load_books_by_ids(ids: List[int]) -> List[Book]:
+    """
+    Вторая фаза загрузки страницы: книги по уже отобранным id, обложки и жанры — IN-запросами.
+    """
+    if not ids:
+        return []
+    stmt = (
         select(Book)
         .options(
-            joinedload(Book.cover),
-            joinedload(Book.genres).joinedload(BookGenre.genre),
+            selectinload(Book.cover),
+            selectinload(Book.genres).selectinload(BookGenre.genre),
         )
-        .order_by(desc(Book.year), desc(Book.id))
+        .where(Book.id.in_(ids))
     )
+    by_id = {b.id: b for b in db.session.scalars(stmt)}
+    return [by_id[i] for i in ids if i in by_id]
 
-    total = db.session.scalar(select(func.count(Book.id))) or 0
 
-    result = db.session.execute(
-        q.limit(page_size).offset((page - 1) * page_size)
-    )
-    books = result.unique().scalars().all()
+def _search_page(query: BookQuery, page: int, page_size: int):
+    ids, total = search_books(query, (page - 1) * page_size, page_size)
+    return load_books_by_ids(ids), total
+
+
+@books_bp.get("/")
+@reads_from_replica
+def index():
+    page_size = current_app.config.get("PAGE_SIZE", 10)
+    max_numbered_pages = current_app.config.get("MAX_NUMBERED_PAGES", 20)
+    # Дальше MAX_NUMBERED_PAGES — только курсор: глубокий OFFSET не строим.
+    page = parse_page_arg(request.args.get("page"), default=1, maximum=max_numbered_pages)
+    query = BookQuery.from_args(request.args)
 
     can_add = current_user.is_authenticated and getattr(current_user.role, "name", None) == "Admin"
     role_name = getattr(getattr(current_user, "role", None), "name", None)
 
+    if query.is_search:
+        books, found = _search_page(query, page, page_size)
+        # Выдача по релевантности листается только по номерам страниц — пагинации
+        # отдаём не больше результатов, чем помещается в MAX_NUMBERED_PAGES.
+        total = min(found, max_numbered_pages * page_size)
+        return render_template(
+            "index.html",
+            books=books,
+            page=page,
+            page_size=page_size,
+            total=total,
+            found=found,
+            query=query,
+            genres=refdata.genres(),
+            facets=catalogue_facets(query),
+            max_numbered_pages=max_numbered_pages,
+            can_add=can_add,
+            role_name=role_name,
+        )
+
+    after = decode_cursor(request.args.get("after"), 2)
+    before = decode_cursor(request.args.get("before"), 2) if not after else None
+    cursor_mode = bool(after or before)
+
+    filters = query.where_clauses()
+    total = facet_index.count(query) if filters else book_total()
+
+    q = select(Book.id).where(*filters)
+
+    if after:
+        year, book_id = after
+        q = q.where(or_(Book.year < year, and_(Book.year == year, Book.id < book_id)))
+        q = q.order_by(desc(Book.year), desc(Book.id))
+    elif before:
+        year, book_id = before
+        q = q.where(or_(Book.year > year, and_(Book.year == year, Book.id > book_id)))
+        q = q.order_by(Book.year.asc(), Book.id.asc())
+    else:
+        q = q.order_by(desc(Book.year), desc(Book.id)).offset((page - 1) * page_size)
+
+    ids = db.session.scalars(q.limit(page_size + 1)).all()
+    has_more = len(ids) > page_size
+    books = load_books_by_ids(ids[:page_size])
+    if before:
+        books.reverse()
+
+    next_cursor = prev_cursor = None
+    if books:
+        if (has_more or before) and (cursor_mode or page >= max_numbered_pages):
+            next_cursor = encode_cursor(books[-1].year, books[-1].id)
+        if cursor_mode and (has_more or after):
+            prev_cursor = encode_cursor(books[0].year, books[0].id)
+
     return render_template(
         "index.html",
         books=books,
         page=page,
         page_size=page_size,
         total=total,
+        query=query,
+        genres=refdata.genres(),
+        facets=catalogue_facets(query),
+        max_numbered_pages=max_numbered_pages,
+        cursor_mode=cursor_mode,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
         can_add=can_add,
         role_name=role_name,
     )
 
 
+@books_bp.get("/books/suggest")
+@reads_from_replica
+def book_suggest():
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        limit = 10
+    items = [
+        {"kind": kind, "value": value, "books": count}
+        for (kind, value), count in suggest_index.suggest(request.args.get("q") or "", limit)
+    ]
+    resp = jsonify({"items": items})
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 30
+    return resp
+
+
 @books_bp.get("/books/new")
 @role_required("Admin")
 def book_new():
-    genres = db.session.scalars(select(Genre).order_by(Genre.name.asc())).all()
+    genres = refdata.genres()
     return render_template("book_form.html", mode="create", genres=genres)
 
 
@@ -97,64 +199,73 @@ def book_create():
         flash("Проверьте корректность полей «год» и «объём (страниц)».", "danger")
         return _render_book_form_backfill("create")
 
-    mime_type = cover_file.mimetype or ""
     allowed = current_app.config.get("ALLOWED_COVER_MIME", set())
-    if allowed and mime_type not in allowed:
+    if allowed and (cover_file.mimetype or "") not in allowed:
         flash("Недопустимый тип файла обложки. Разрешены: JPEG/PNG/WebP.", "danger")
         return _render_book_form_backfill("create")
 
-    file_bytes = cover_file.read()
-    if not file_bytes:
-        flash("Файл обложки пустой.", "danger")
-        return _render_book_form_backfill("create")
-
-    md5_hex = calc_md5(file_bytes)
-    existing_cover: Optional[Cover] = db.session.scalar(select(Cover).where(Cover.md5 == md5_hex))
-
+    upload = ingest_cover_upload(cover_file.stream)
     try:
-        if existing_cover:
-            cover = existing_cover
-        else:
-            cover = Cover(filename="__tmp__", mime_type=mime_type, md5=md5_hex)
-            db.session.add(cover)
-            db.session.flush()
-
-        book = Book(
-            title=title,
-            short_description=short_description_raw,
-            year=year_i,
-            publisher=publisher,
-            author=author,
-            pages=pages_i,
-            cover_id=cover.id,
-        )
-        db.session.add(book)
-        db.session.flush()
-
-        if genre_ids:
-            valid_genre_ids = [int(g) for g in genre_ids if str(g).isdigit()]
-            if valid_genre_ids:
-                rows = db.session.scalars(select(Genre.id).where(Genre.id.in_(valid_genre_ids))).all()
-                for gid in rows:
-                    db.session.add(BookGenre(book_id=book.id, genre_id=gid))
-
-        if not existing_cover:
-            filename, full_path = save_cover_file(
+        if not upload.size:
+            flash("Файл обложки пустой.", "danger")
+            return _render_book_form_backfill("create")
+
+        mime_type = upload.mime_type
+        if not mime_type or (allowed and mime_type not in allowed):
+            flash("Недопустимый тип файла обложки. Разрешены: JPEG/PNG/WebP.", "danger")
+            return _render_book_form_backfill("create")
+
+        existing_cover: Optional[Cover] = db.session.scalar(select(Cover).where(Cover.md5 == upload.md5))
+        placed: Optional[Tuple[str, int]] = None
+
+        try:
+            if existing_cover:
+                cover = existing_cover
+            else:
+                cover = Cover(filename="__tmp__", mime_type=mime_type, md5=upload.md5)
+                db.session.add(cover)
+                db.session.flush()
+
+            description_html, render_version = render_markdown_for_storage(short_description_raw)
+            book = Book(
+                title=title,
+                short_description=short_description_raw,
+                short_description_html=description_html,
+                short_description_render_version=render_version,
+                year=year_i,
+                publisher=publisher,
+                author=author,
+                pages=pages_i,
                 cover_id=cover.id,
-                file_bytes=file_bytes,
-                mime_type=mime_type,
-                original_filename=cover_file.filename,
             )
-            cover.filename = filename
+            db.session.add(book)
+            db.session.flush()
+            create_book_stats(book.id)
 
-        db.session.commit()
-        flash("Книга успешно добавлена.", "success")
-        return redirect(url_for("books.book_view", book_id=book.id))
+            for gid in refdata.valid_genre_ids(genre_ids):
+                db.session.add(BookGenre(book_id=book.id, genre_id=gid))
 
-    except Exception:
-        db.session.rollback()
-        flash("При сохранении данных возникла ошибка. Проверьте корректность введённых данных.", "danger")
-        return _render_book_form_backfill("create")
+            if not existing_cover:
+                filename, full_path = commit_cover_file(cover.id, upload.tmp_path, mime_type)
+                placed = (filename, cover.id)
+                cover.filename = filename
+                schedule_cover_variants(db.session, cover.id, filename, full_path)
+
+            bump_catalogue_version()
+            db.session.commit()
+            counters.incr(BOOKS_TOTAL, 1)
+            books_changed([book.id])
+            flash("Книга успешно добавлена.", "success")
+            return redirect(url_for("books.book_view", book_id=book.id))
+
+        except Exception:
+            db.session.rollback()
+            if placed:
+                remove_cover_files(*placed)
+            flash("При сохранении данных возникла ошибка. Проверьте корректность введённых данных.", "danger")
+            return _render_book_form_backfill("create")
+    finally:
+        discard_upload(upload.tmp_path)
 
 
 @books_bp.get("/books/<int:book_id>/edit")
@@ -164,7 +275,7 @@ def book_edit(book_id: int):
     if not book:
         flash("Книга не найдена.", "warning")
         return redirect(url_for("books.index"))
-    genres = db.session.scalars(select(Genre).order_by(Genre.name.asc())).all()
+    genres = refdata.genres()
     selected_genres = {bg.genre_id for bg in book.genres}
     return render_template("book_form.html", mode="edit", book=book, genres=genres, selected_genres=selected_genres)
 
@@ -197,19 +308,21 @@ def book_update(book_id: int):
     try:
         book.title = title
         book.short_description = short_description_raw
+        book.short_description_html, book.short_description_render_version = (
+            render_markdown_for_storage(short_description_raw)
+        )
         book.year = year_i
         book.publisher = publisher
         book.author = author
         book.pages = pages_i
 
         db.session.query(BookGenre).filter(BookGenre.book_id == book.id).delete(synchronize_session=False)
-        valid_genre_ids = [int(g) for g in genre_ids if str(g).isdigit()]
-        if valid_genre_ids:
-            rows = db.session.scalars(select(Genre.id).where(Genre.id.in_(valid_genre_ids))).all()
-            for gid in rows:
-                db.session.add(BookGenre(book_id=book.id, genre_id=gid))
+        for gid in refdata.valid_genre_ids(genre_ids):
+            db.session.add(BookGenre(book_id=book.id, genre_id=gid))
 
+        bump_catalogue_version()
         db.session.commit()
+        books_changed([book.id])
         flash("Изменения сохранены.", "success")
         return redirect(url_for("books.book_view", book_id=book.id))
     except Exception:
@@ -242,9 +355,14 @@ def book_delete(book_id: int):
             if cover:
                 db.session.delete(cover)
             if cover_filename:
-                remove_cover_file(cover_filename)
+                schedule_cover_removal(db.session, cover_filename, cover_id)
 
+        bump_catalogue_version()
         db.session.commit()
+        counters.incr(BOOKS_TOTAL, -1)
+        books_changed([book_id])
+        counters.invalidate_group("reviews_by_status")
+        counters.invalidate_group("reviews_by_user")
         flash("Книга успешно удалена.", "success")
     except Exception:
         db.session.rollback()
@@ -254,13 +372,13 @@ def book_delete(book_id: int):
 
 
 @books_bp.get("/books/<int:book_id>")
+@reads_from_replica
 def book_view(book_id: int):
     stmt = (
         select(Book)
         .options(
             joinedload(Book.cover),
             joinedload(Book.genres).joinedload(BookGenre.genre),
-            joinedload(Book.reviews).joinedload(Review.user),
         )
         .where(Book.id == book_id)
     )
@@ -269,24 +387,29 @@ def book_view(book_id: int):
         flash("Книга не найдена.", "warning")
         return redirect(url_for("books.index"))
 
-    description_html = markdown_to_html_safe(book.short_description or "")
+    description_html = stored_markdown_html(
+        book.short_description, book.short_description_html, book.short_description_render_version
+    )
 
     my_review = None
     if current_user.is_authenticated:
-        for r in book.reviews:
-            if r.user_id == current_user.id:
-                my_review = r
-                break
+        my_review = find_user_review(book.id, current_user.id)
+
+    exclude_id = my_review.id if my_review else None
+    reviews, next_cursor = approved_reviews_page(book.id, exclude_id=exclude_id)
 
     return render_template(
         "book_view.html",
         book=book,
         description_html=description_html,
         my_review=my_review,
+        reviews=reviews,
+        next_cursor=next_cursor,
+        exclude_id=exclude_id,
     )
 
 
 def _render_book_form_backfill(mode: str):
-    genres = db.session.scalars(select(Genre).order_by(Genre.name.asc())).all()
+    genres = refdata.genres()
     form = request.form
     return render_template("book_form.html", mode=mode, genres=genres, form=form), 400
\ No newline at end of file
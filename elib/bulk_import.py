@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import itertools
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+
+from . import db
+from .catalogue import bump_catalogue_version
+from .covers import remove_cover_files
+from .models import Book, BookGenre, BookStats, Cover, ImportJob
+from .refdata import refdata
+from .utils import (
+    COVER_CHUNK_SIZE,
+    commit_cover_file,
+    discard_upload,
+    ensure_covers_dir,
+    markdown_render_settings,
+    markdown_renderer_version,
+    render_markdown,
+    sniff_image_mime,
+)
+
+# Разделитель жанров в CSV; в JSONL жанры можно передать списком.
+CSV_GENRE_SEPARATOR = ";"
+
+Record = Tuple[int, dict]
+
+
+class ManifestError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ManifestRow:
+    line: int
+    title: str
+    author: str
+    publisher: str
+    short_description: str
+    year: int
+    pages: int
+    genres: Tuple[str, ...]
+    cover: str
+
+
+@dataclass(frozen=True)
+class PreparedCover:
+    md5: str
+    mime_type: Optional[str]
+    size: int
+
+
+@dataclass
+class ImportProgress:
+    position: int
+    imported: int
+    skipped: int
+    elapsed: float
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+@dataclass
+class ImportResult:
+    job: ImportJob
+    already_finished: bool = False
+    new_covers: int = 0
+    unknown_genres: List[str] = field(default_factory=list)
+
+
+def manifest_key(path: Path) -> str:
+    """Ключ идемпотентности по умолчанию — MD5 содержимого манифеста."""
+    h = hashlib.md5()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(COVER_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def detect_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ManifestError(f"Не удалось определить формат манифеста по расширению {suffix!r}; укажите --format.")
+
+
+def read_manifest(path: Path, fmt: str) -> Iterator[Record]:
+    """Записи манифеста по одной: (номер строки, словарь полей)."""
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for raw in reader:
+                yield reader.line_num, raw
+            return
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError as exc:
+                raw = {"__error__": f"некорректный JSON: {exc}"}
+            yield line_no, raw if isinstance(raw, dict) else {"__error__": "ожидался JSON-объект"}
+
+
+def _text(raw: dict, name: str, required: bool = True) -> str:
+    value = raw.get(name)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise ManifestError(f"не заполнено поле {name!r}")
+    return value
+
+
+def parse_record(line: int, raw: dict) -> ManifestRow:
+    if "__error__" in raw:
+        raise ManifestError(raw["__error__"])
+    try:
+        year = int(raw.get("year"))
+        pages = int(raw.get("pages"))
+    except (TypeError, ValueError):
+        raise ManifestError("поля year и pages должны быть целыми числами") from None
+    if not (1000 <= year <= 2100) or pages <= 0:
+        raise ManifestError("год должен быть в диапазоне 1000–2100, число страниц — больше нуля")
+
+    genres = raw.get("genres") or ()
+    if isinstance(genres, str):
+        genres = genres.split(CSV_GENRE_SEPARATOR)
+    cover = _text(raw, "cover")
+    if Path(cover).is_absolute() or ".." in Path(cover).parts:
+        raise ManifestError("путь к обложке должен быть относительным и не выходить за каталог обложек")
+
+    return ManifestRow(
+        line=line,
+        title=_text(raw, "title"),
+        author=_text(raw, "author"),
+        publisher=_text(raw, "publisher"),
+        short_description=_text(raw, "short_description", required=False),
+        year=year,
+        pages=pages,
+        genres=tuple(str(g).strip() for g in genres if str(g).strip()),
+        cover=cover,
+    )
+
+
+class GenreLookup:
+    """Жанры по названию (без учёта регистра) или id — из справочника, один раз на импорт."""
+
+    def __init__(self) -> None:
+        genres = refdata.genres()
+        self._by_name = {g.name.casefold(): g.id for g in genres}
+        self._ids = {g.id for g in genres}
+        self.unknown: Set[str] = set()
+
+    def resolve(self, names: Tuple[str, ...]) -> List[int]:
+        ids = set()
+        for name in names:
+            genre_id = int(name) if name.isdigit() and int(name) in self._ids else self._by_name.get(name.casefold())
+            if genre_id is None:
+                self.unknown.add(name)
+            else:
+                ids.add(genre_id)
+        return sorted(ids)
+
+
+def _prepare_one(task: Tuple[str, str], settings) -> Tuple[Optional[PreparedCover], str]:
+    """
+    В процессе пула: MD5 и тип файла обложки (потоково) и HTML описания.
+    Ошибку чтения файла возвращаем как PreparedCover=None, чтобы не ронять пачку.
+    """
+    cover_path, description = task
+    html = render_markdown(description, *settings)
+    h = hashlib.md5()
+    head = b""
+    size = 0
+    try:
+        with open(cover_path, "rb") as f:
+            for chunk in iter(lambda: f.read(COVER_CHUNK_SIZE), b""):
+                if len(head) < 12:
+                    head += chunk[: 12 - len(head)]
+                h.update(chunk)
+                size += len(chunk)
+    except OSError:
+        return None, html
+    return PreparedCover(md5=h.hexdigest(), mime_type=sniff_image_mime(head), size=size), html
+
+
+def _stage_cover(src: Path, covers_dir: Path) -> Path:
+    with tempfile.NamedTemporaryFile("wb", delete=False, dir=str(covers_dir), prefix=".upload-", suffix=".part") as tmp:
+        tmp_path = Path(tmp.name)
+        try:
+            with src.open("rb") as f:
+                shutil.copyfileobj(f, tmp, COVER_CHUNK_SIZE)
+        except BaseException:
+            tmp.close()
+            discard_upload(tmp_path)
+            raise
+    return tmp_path
+
+
+def import_key(job_key: str, line: int) -> str:
+    return f"{job_key}:{line}"
+
+
+def _insert_books_returning_ids(books: List[dict]) -> List[int]:
+    """
+    Вставляет книги одним executemany и возвращает их id в порядке ``books``; id
+    назначает сама БД. На MySQL нет RETURNING, а id многострочной вставки идут подряд
+    не при любом innodb_autoinc_lock_mode, поэтому id читаются обратно по уникальному
+    ``import_key`` каждой книги.
+    """
+    db.session.execute(insert(Book), books)
+    keys = [book["import_key"] for book in books]
+    ids: Dict[str, int] = {}
+    for i in range(0, len(keys), 1000):
+        part = keys[i:i + 1000]
+        ids.update(db.session.execute(select(Book.import_key, Book.id).where(Book.import_key.in_(part))).all())
+    return [ids[key] for key in keys]
+
+
+class CatalogueImporter:
+    def __init__(self, source_dir: Path, pool: ProcessPoolExecutor) -> None:
+        self.source_dir = source_dir
+        self.pool = pool
+        self.covers_dir = ensure_covers_dir()
+        self.allowed_mime = current_app.config.get("ALLOWED_COVER_MIME", set())
+        self.genres = GenreLookup()
+        self.settings = markdown_render_settings()
+        self.render_version = markdown_renderer_version()
+        # MD5 → id обложек, уже известных по БД или этому импорту.
+        self.cover_ids: Dict[str, int] = {}
+        self.new_covers = 0
+
+    def _known_covers(self, md5s: Set[str]) -> None:
+        missing = sorted(md5s - self.cover_ids.keys())
+        for i in range(0, len(missing), 1000):
+            part = missing[i:i + 1000]
+            self.cover_ids.update(db.session.execute(select(Cover.md5, Cover.id).where(Cover.md5.in_(part))).all())
+
+    def import_chunk(self, job: ImportJob, records: List[Record]) -> List[Tuple[int, str]]:
+        """Одна пачка записей — одна транзакция вместе с продвижением ``job.position``."""
+        errors: List[Tuple[int, str]] = []
+        rows: List[ManifestRow] = []
+        for line, raw in records:
+            try:
+                rows.append(parse_record(line, raw))
+            except ManifestError as exc:
+                errors.append((line, str(exc)))
+
+        render = partial(_prepare_one, settings=self.settings)
+        tasks = [(str(self.source_dir / row.cover), row.short_description) for row in rows]
+        prepared = list(self.pool.map(render, tasks, chunksize=max(1, len(tasks) // 32)))
+
+        accepted: List[Tuple[ManifestRow, PreparedCover, str]] = []
+        for row, (cover, html) in zip(rows, prepared):
+            if cover is None:
+                errors.append((row.line, f"не удалось прочитать обложку {row.cover!r}"))
+            elif not cover.size:
+                errors.append((row.line, f"файл обложки {row.cover!r} пустой"))
+            elif not cover.mime_type or (self.allowed_mime and cover.mime_type not in self.allowed_mime):
+                errors.append((row.line, f"недопустимый тип файла обложки {row.cover!r}"))
+            else:
+                accepted.append((row, cover, html))
+
+        placed: List[Tuple[str, int]] = []
+        new_ids: Dict[str, int] = {}
+        try:
+            if accepted:
+                new_ids = self._insert_covers(accepted, placed)
+                self._insert_books(job, accepted, {**self.cover_ids, **new_ids})
+                bump_catalogue_version()
+            job.position += len(records)
+            job.imported += len(accepted)
+            job.skipped += len(errors)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            for filename, cover_id in placed:
+                remove_cover_files(filename, cover_id)
+            raise
+        self.cover_ids.update(new_ids)
+        self.new_covers += len(new_ids)
+        return sorted(errors)
+
+    def _insert_covers(self, accepted, placed: List[Tuple[str, int]]) -> Dict[str, int]:
+        self._known_covers({cover.md5 for _row, cover, _html in accepted})
+
+        sources: Dict[str, Tuple[ManifestRow, PreparedCover]] = {}
+        for row, cover, _html in accepted:
+            if cover.md5 not in self.cover_ids:
+                sources.setdefault(cover.md5, (row, cover))
+        if not sources:
+            return {}
+
+        db.session.execute(
+            insert(Cover),
+            [{"filename": "__tmp__", "mime_type": cover.mime_type, "md5": md5} for md5, (_row, cover) in sources.items()],
+        )
+        new_ids = dict(db.session.execute(select(Cover.md5, Cover.id).where(Cover.md5.in_(list(sources)))).all())
+
+        updates = []
+        for md5, (row, cover) in sources.items():
+            tmp_path = _stage_cover(self.source_dir / row.cover, self.covers_dir)
+            try:
+                filename, _full_path = commit_cover_file(new_ids[md5], tmp_path, cover.mime_type)
+            finally:
+                discard_upload(tmp_path)
+            placed.append((filename, new_ids[md5]))
+            updates.append({"id": new_ids[md5], "filename": filename})
+        db.session.execute(update(Cover), updates)
+        return new_ids
+
+    def _insert_books(self, job: ImportJob, accepted, cover_ids: Dict[str, int]) -> None:
+        books = [
+            {
+                "import_key": import_key(job.key, row.line),
+                "title": row.title,
+                "author": row.author,
+                "publisher": row.publisher,
+                "short_description": row.short_description,
+                "short_description_html": html,
+                "short_description_render_version": self.render_version,
+                "year": row.year,
+                "pages": row.pages,
+                "cover_id": cover_ids[cover.md5],
+            }
+            for row, cover, html in accepted
+        ]
+        book_ids = _insert_books_returning_ids(books)
+
+        genres, stats = [], []
+        for book_id, (row, _cover, _html) in zip(book_ids, accepted):
+            genres.extend({"book_id": book_id, "genre_id": gid} for gid in self.genres.resolve(row.genres))
+            stats.append({"book_id": book_id, "reviews_count": 0, "approved_count": 0, "approved_rating_sum": 0})
+        if genres:
+            db.session.execute(insert(BookGenre), genres)
+        db.session.execute(insert(BookStats), stats)
+
+
+def _batched(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_catalogue(
+    manifest: Path,
+    source_dir: Path,
+    key: str,
+    fmt: str,
+    batch_size: int = 1000,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[ImportProgress], None]] = None,
+) -> ImportResult:
+    """
+    Пакетный импорт книг из манифеста. Пачка из ``batch_size`` записей коммитится
+    вместе с позицией в ``import_jobs``, поэтому прерванный импорт с тем же ключом
+    продолжается с первой незакоммиченной записи, а завершённый не повторяется.
+    """
+    job = db.session.get(ImportJob, key)
+    if job is None:
+        job = ImportJob(key=key, source=str(manifest)[-255:], position=0, imported=0, skipped=0)
+        db.session.add(job)
+        db.session.commit()
+    if job.finished_at is not None:
+        return ImportResult(job=job, already_finished=True)
+
+    started = time.perf_counter()
+    records = itertools.islice(read_manifest(manifest, fmt), job.position, None)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        importer = CatalogueImporter(source_dir, pool)
+        for chunk in _batched(records, batch_size):
+            errors = importer.import_chunk(job, chunk)
+            if progress:
+                progress(ImportProgress(job.position, job.imported, job.skipped, time.perf_counter() - started, errors))
+
+    job.finished_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.session.commit()
+    return ImportResult(job=job, new_covers=importer.new_covers, unknown_genres=sorted(importer.genres.unknown))
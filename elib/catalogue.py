@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import abc
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import select, update
+
+from . import db
+from .models import Book, BookGenre, DataVersion
+from .replicas import primary
+
+
+@dataclass(frozen=True)
+class BookDoc:
+    id: int
+    title: str
+    author: str
+    publisher: str
+    short_description: str
+    year: int
+    genre_ids: FrozenSet[int]
+
+
+def load_book_docs(book_ids: Optional[Iterable[int]] = None, batch_size: int = 2000) -> Iterator[BookDoc]:
+    """
+    Книги для индексов в памяти: только нужные столбцы, без ORM-объектов.
+    ``book_ids=None`` — весь каталог.
+    """
+    ids = None if book_ids is None else sorted(set(book_ids))
+    if ids is not None and not ids:
+        return
+
+    genre_stmt = select(BookGenre.book_id, BookGenre.genre_id)
+    book_stmt = select(Book.id, Book.title, Book.author, Book.publisher, Book.short_description, Book.year)
+    if ids is not None:
+        genre_stmt = genre_stmt.where(BookGenre.book_id.in_(ids))
+        book_stmt = book_stmt.where(Book.id.in_(ids))
+
+    genres: Dict[int, set] = defaultdict(set)
+    for book_id, genre_id in db.session.execute(genre_stmt):
+        genres[book_id].add(genre_id)
+
+    rows = db.session.execute(book_stmt.order_by(Book.id).execution_options(yield_per=batch_size))
+    for row in rows:
+        yield BookDoc(
+            id=row.id,
+            title=row.title or "",
+            author=row.author or "",
+            publisher=row.publisher or "",
+            short_description=row.short_description or "",
+            year=row.year,
+            genre_ids=frozenset(genres.get(row.id, ())),
+        )
+
+
+def catalogue_version() -> int:
+    return db.session.scalar(
+        select(DataVersion.version).where(DataVersion.name == DataVersion.CATALOGUE)
+    ) or 0
+
+
+def bump_catalogue_version() -> None:
+    """
+    Отметить изменение каталога в текущей транзакции (вызывается перед commit).
+    """
+    result = db.session.execute(
+        update(DataVersion)
+        .where(DataVersion.name == DataVersion.CATALOGUE)
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(DataVersion(name=DataVersion.CATALOGUE, version=1))
+
+
+class CatalogueIndex(abc.ABC):
+    """
+    Основа для индексов каталога в памяти процесса.
+
+    Индекс строится при первом обращении и перестраивается, когда меняется строка
+    ``data_versions['catalogue']`` (проверка не чаще раза в ``CATALOGUE_CHECK_INTERVAL``
+    секунд). Все индексы процесса строятся вместе из одной выборки каталога
+    (:func:`rebuild_indexes`); перестройка после смены версии идёт в фоновом потоке,
+    а запросы до подмены обслуживает прежний снимок. Собственные изменения процесса
+    накатываются точечно через :func:`books_changed`, без полной перестройки.
+    """
+
+    def __init__(self, check_interval: float = 30.0) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        # Правки, пришедшие во время перестройки: накатываются на новый снимок.
+        self._missed: Optional[List[Tuple[List[int], List[BookDoc], int]]] = None
+
+    def init_app(self, app: Flask) -> None:
+        self.check_interval = float(app.config.get("CATALOGUE_CHECK_INTERVAL", self.check_interval))
+        self.invalidate()
+
+    def enabled(self) -> bool:
+        """Нужен ли индекс в этой конфигурации; ненужные не строятся вместе с остальными."""
+        return True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.check_interval:
+            return
+        if not self._loaded:
+            # Отдавать пока нечего — строим сразу, вместе с остальными индексами.
+            rebuild_indexes(self)
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        # Версию берём с основной БД: отстающая реплика вернула бы старую версию,
+        # и индекс, уже получивший свои правки, перестроился бы назад.
+        with primary():
+            version = catalogue_version()
+        if version != self._version:
+            _rebuild_in_background(current_app._get_current_object())
+
+    def _build(self, docs: Iterable[BookDoc]) -> Dict[str, object]:
+        """
+        Состояние индекса (атрибуты, которые задаёт ``_reset``), собранное по ``docs``
+        в стороне от текущего — его можно строить, не блокируя запросы.
+        """
+        fresh = object.__new__(type(self))
+        fresh._load(docs)
+        return vars(fresh)
+
+    def _begin_rebuild(self) -> None:
+        with self._lock:
+            self._missed = []
+
+    def _swap(self, state: Optional[Dict[str, object]], version: int) -> None:
+        """Подменить снимок на новый (``None`` — перестройка не удалась)."""
+        with self._lock:
+            missed, self._missed = self._missed or [], None
+            if state is None:
+                return
+            self.__dict__.update(state)
+            self._version = version
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            for book_ids, docs, patch_version in missed:
+                self._apply(book_ids, docs, patch_version)
+
+    def _patch(self, book_ids: List[int], docs: List[BookDoc], version: int) -> None:
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append((book_ids, docs, version))
+            if self._loaded:
+                self._apply(book_ids, docs, version)
+
+    def _apply(self, book_ids: List[int], docs: List[BookDoc], version: int) -> None:
+        for book_id in book_ids:
+            self._remove(book_id)
+        for doc in docs:
+            self._add(doc)
+        # Версия выросла ровно на наш commit — индекс по-прежнему актуален;
+        # иначе были и чужие изменения, и при следующей проверке он перестроится.
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+
+    def _load(self, docs: Iterable[BookDoc]) -> None:
+        self._reset()
+        for doc in docs:
+            self._add(doc)
+
+    @abc.abstractmethod
+    def _reset(self) -> None:
+        """Очистить индекс перед полной загрузкой."""
+
+    @abc.abstractmethod
+    def _add(self, doc: BookDoc) -> None:
+        """Добавить книгу в индекс."""
+
+    @abc.abstractmethod
+    def _remove(self, book_id: int) -> None:
+        """Убрать книгу из индекса (если её там нет — ничего не делать)."""
+
+
+_indexes: List[CatalogueIndex] = []
+_rebuild_lock = threading.Lock()
+_thread_lock = threading.Lock()
+_rebuild_thread: Optional[threading.Thread] = None
+
+
+def register_index(index: CatalogueIndex) -> CatalogueIndex:
+    _indexes.append(index)
+    return index
+
+
+def rebuild_indexes(required: Optional[CatalogueIndex] = None) -> None:
+    """
+    Перестроить все нужные индексы процесса из одной выборки каталога. С ``required``
+    (ещё не построенный индекс, к которому обратился запрос) — только если он всё ещё
+    не построен: параллельная перестройка могла успеть раньше.
+    """
+    with _rebuild_lock:
+        if required is not None and required._loaded:
+            return
+        targets = [index for index in _indexes if index is required or index.enabled()]
+        for index in targets:
+            index._begin_rebuild()
+        states: Dict[int, Dict[str, object]] = {}
+        version = 0
+        try:
+            with primary():
+                version = catalogue_version()
+                docs = list(load_book_docs())
+            for index in targets:
+                states[id(index)] = index._build(docs)
+        finally:
+            for index in targets:
+                index._swap(states.get(id(index)), version)
+
+
+def _rebuild_in_background(app: Flask) -> None:
+    global _rebuild_thread
+    with _thread_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return
+        _rebuild_thread = threading.Thread(
+            target=_run_rebuild, args=(app,), name="catalogue-rebuild", daemon=True
+        )
+        _rebuild_thread.start()
+
+
+def _run_rebuild(app: Flask) -> None:
+    with app.app_context():
+        try:
+            rebuild_indexes()
+        except Exception:
+            app.logger.warning("Catalogue indexes: background rebuild failed", exc_info=True)
+
+
+def books_changed(book_ids: Iterable[int]) -> None:
+    """
+    Накатить на индексы процесса уже закоммиченные изменения книг (создание,
+    правка, удаление). Вызывается после commit, в котором был bump_catalogue_version().
+    """
+    ids = sorted(set(book_ids))
+    if not ids or not any(index._loaded or index._missed is not None for index in _indexes):
+        return
+    try:
+        docs = list(load_book_docs(ids))
+        version = catalogue_version()
+    except Exception:
+        # Изменения уже в БД; индексы просто перестроятся при следующем обращении.
+        current_app.logger.warning("Catalogue indexes: failed to apply changes to %s", ids, exc_info=True)
+        for index in _indexes:
+            index.invalidate()
+        return
+    for index in _indexes:
+        index._patch(ids, docs, version)
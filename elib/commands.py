@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, exists, select, update, or_
+
+from . import db
+
+
+book_stats_cli = AppGroup("book-stats", help="Агрегаты рецензий по книгам (таблица book_stats).")
+
+
+@book_stats_cli.command("rebuild")
+def book_stats_rebuild() -> None:
+    """Пересчитать book_stats целиком из reviews."""
+    from .stats import rebuild_book_stats
+
+    rows = rebuild_book_stats()
+    click.echo(f"book_stats rebuilt: {rows} rows.")
+
+
+@book_stats_cli.command("verify")
+def book_stats_verify() -> None:
+    """Сверить book_stats с reviews; код возврата 1 при расхождениях."""
+    from .stats import verify_book_stats
+
+    mismatches = verify_book_stats()
+    for book_id, expected, actual in mismatches:
+        click.echo(f"book_id={book_id}: expected={expected} stored={actual}")
+    if mismatches:
+        raise SystemExit(1)
+    click.echo("book_stats is consistent.")
+
+
+markdown_cli = AppGroup("markdown", help="Сохранённый HTML описаний книг и рецензий.")
+
+
+def _backfill_rendered(pool, model, src_attr, html_attr, version_attr, settings, version, batch_size, force) -> int:
+    src_col = getattr(model, src_attr)
+    html_col = getattr(model, html_attr)
+    version_col = getattr(model, version_attr)
+    render = partial(_render_one, settings=settings)
+
+    done = 0
+    last_id = 0
+    while True:
+        stmt = select(model.id, src_col).where(model.id > last_id).order_by(model.id).limit(batch_size)
+        if not force:
+            stmt = stmt.where(or_(html_col.is_(None), version_col.is_(None), version_col != version))
+        rows = db.session.execute(stmt).all()
+        if not rows:
+            break
+
+        htmls = pool.map(render, [row[1] for row in rows], chunksize=max(1, len(rows) // 32))
+        db.session.execute(
+            update(model),
+            [
+                {"id": row[0], html_attr: html, version_attr: version}
+                for row, html in zip(rows, htmls)
+            ],
+        )
+        db.session.commit()
+
+        done += len(rows)
+        last_id = rows[-1][0]
+        click.echo(f"{model.__tablename__}: {done} rendered")
+    return done
+
+
+def _render_one(src_text: str, settings) -> str:
+    from .utils import render_markdown
+
+    return render_markdown(src_text, *settings)
+
+
+@markdown_cli.command("backfill")
+@click.option("--workers", type=int, default=None, help="Число процессов рендера (по умолчанию — число CPU).")
+@click.option("--batch-size", type=int, default=500, show_default=True)
+@click.option("--force", is_flag=True, help="Перерендерить все строки, а не только устаревшие.")
+def markdown_backfill(workers, batch_size, force) -> None:
+    """Отрендерить Markdown в HTML для строк без актуальной версии рендера."""
+    from .models import Book, Review
+    from .utils import markdown_render_settings, markdown_renderer_version
+
+    settings = markdown_render_settings()
+    version = markdown_renderer_version()
+
+    targets = (
+        (Book, "short_description", "short_description_html", "short_description_render_version"),
+        (Review, "text", "text_html", "text_render_version"),
+    )
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for model, src_attr, html_attr, version_attr in targets:
+            n = _backfill_rendered(
+                pool, model, src_attr, html_attr, version_attr, settings, version, batch_size, force
+            )
+            click.echo(f"{model.__tablename__}: done, {n} rows (renderer {version}).")
+
+
+refdata_cli = AppGroup("refdata", help="Справочники: статусы рецензий, роли, жанры.")
+
+
+@refdata_cli.command("bump")
+def refdata_bump() -> None:
+    """Повысить версию справочников, чтобы все процессы перечитали их."""
+    from .refdata import bump_refdata_version
+
+    bump_refdata_version()
+    db.session.commit()
+    click.echo("refdata version bumped.")
+
+
+covers_cli = AppGroup("covers", help="Файлы обложек и их варианты.")
+
+
+@covers_cli.command("variants")
+@click.option("--workers", type=int, default=None, help="Число процессов (по умолчанию — число CPU).")
+@click.option("--batch-size", type=int, default=200, show_default=True)
+@click.option("--force", is_flag=True, help="Перегенерировать даже актуальные варианты.")
+@click.option(
+    "--missing", is_flag=True,
+    help="Только обложки без актуального variants_version (например, не доделанные после загрузки).",
+)
+def covers_variants(workers, batch_size, force, missing) -> None:
+    """Сгенерировать миниатюры и WebP/JPEG-варианты для существующих обложек."""
+    from .models import Cover
+    from .thumbnails import VARIANTS_VERSION, submit_cover_variants, variants_up_to_date, wait_cover_variants
+
+    covers_dir = Path(current_app.config["COVERS_DIR"])
+    generated = skipped = failed = 0
+    last_id = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            stmt = (
+                select(Cover.id, Cover.filename, Cover.variants_version)
+                .where(Cover.id > last_id)
+                .order_by(Cover.id)
+                .limit(batch_size)
+            )
+            if missing:
+                stmt = stmt.where(or_(Cover.variants_version.is_(None), Cover.variants_version != VARIANTS_VERSION))
+            rows = db.session.execute(stmt).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            pending = {}
+            updates = []
+            for row in rows:
+                src_path = covers_dir / row.filename
+                fresh = not force and variants_up_to_date(row.filename, row.id, src_path)
+                if fresh:
+                    skipped += 1
+                    if row.variants_version != VARIANTS_VERSION:
+                        updates.append({"id": row.id, "variants_version": VARIANTS_VERSION})
+                elif not src_path.is_file():
+                    failed += 1
+                    click.echo(f"cover {row.id}: original {row.filename} is missing", err=True)
+                else:
+                    pending[row.id] = submit_cover_variants(pool, row.id, row.filename, src_path)
+
+            for cover_id, futures in pending.items():
+                version = wait_cover_variants(cover_id, futures)
+                if version is None:
+                    failed += 1
+                else:
+                    generated += 1
+                updates.append({"id": cover_id, "variants_version": version})
+
+            if updates:
+                db.session.execute(update(Cover), updates)
+            db.session.commit()
+            click.echo(f"covers up to id {last_id}: generated={generated} skipped={skipped} failed={failed}")
+
+    click.echo(f"Done: generated={generated} skipped={skipped} failed={failed}.")
+
+
+def _stage_file(src: Path, dst: Path) -> bool:
+    """
+    Делает файл доступным по новому пути, не убирая старый (жёсткая ссылка, иначе копия).
+    """
+    if dst.exists():
+        return True
+    if not src.exists():
+        return False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return True
+
+
+@covers_cli.command("relayout")
+@click.option("--to", "layout", default=None, help="Целевая раскладка (по умолчанию — COVER_STORAGE).")
+@click.option("--batch-size", type=int, default=500, show_default=True)
+@click.option("--start-id", type=int, default=0, help="Продолжить с обложек с id больше указанного.")
+def covers_relayout(layout, batch_size, start_id) -> None:
+    """Перенести файлы обложек (и их варианты) в раскладку хранилища.
+
+    Работает на живой системе: файл сначала появляется по новому пути, затем
+    в БД меняется Cover.filename, и только после commit удаляется старый путь.
+    Перенесённые обложки при повторном запуске пропускаются.
+    """
+    from .models import Cover
+    from .thumbnails import variant_filenames
+    from .utils import cover_storage
+
+    storage = cover_storage(layout)
+    moved = skipped = missing = 0
+    last_id = start_id
+    while True:
+        rows = db.session.execute(
+            select(Cover.id, Cover.filename)
+            .where(Cover.id > last_id)
+            .order_by(Cover.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        updates = []
+        stale = []
+        for row in rows:
+            target = storage.relative_path(row.id, os.path.splitext(row.filename)[1])
+            if target == row.filename:
+                skipped += 1
+                continue
+            if not _stage_file(storage.path(row.filename), storage.path(target)):
+                missing += 1
+                click.echo(f"cover {row.id}: original {row.filename} is missing", err=True)
+                continue
+            for old_variant, new_variant in zip(variant_filenames(row.filename, row.id), variant_filenames(target, row.id)):
+                _stage_file(storage.path(old_variant), storage.path(new_variant))
+            updates.append({"id": row.id, "filename": target})
+            stale.append(row)
+
+        if updates:
+            db.session.execute(update(Cover), updates)
+        db.session.commit()
+
+        for row in stale:
+            storage.remove(row.filename)
+            for old_variant in variant_filenames(row.filename, row.id):
+                storage.remove(old_variant)
+        moved += len(stale)
+        click.echo(f"covers up to id {last_id}: moved={moved} skipped={skipped} missing={missing}")
+
+    click.echo(f"Done ({storage.name}): moved={moved} skipped={skipped} missing={missing}.")
+
+
+def _format_bytes(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    size = float(n)
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+        if size < 1024:
+            break
+    return f"{size:.1f} {unit}"
+
+
+@covers_cli.command("gc")
+@click.option("--batch-size", type=int, default=500, show_default=True)
+@click.option("--grace", type=int, default=3600, show_default=True,
+              help="Не трогать файлы моложе стольких секунд (загрузки в процессе).")
+@click.option("--dry-run", is_flag=True, help="Только посчитать, ничего не удаляя.")
+def covers_gc(batch_size, grace, dry_run) -> None:
+    """Удалить обложки без книг и файлы в COVERS_DIR, на которые не ссылается covers."""
+    from .covers import remove_cover_files
+    from .models import Book, Cover
+    from .thumbnails import variant_filenames
+    from .utils import cover_storage
+
+    storage = cover_storage()
+    unused = ~exists().where(Book.cover_id == Cover.id)
+
+    rows_deleted = files_deleted = 0
+    reclaimed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Cover.id, Cover.filename)
+            .where(Cover.id > last_id, unused)
+            .order_by(Cover.id)
+            .limit(batch_size)
+            .with_for_update()
+        ).all()
+        if not rows:
+            db.session.rollback()
+            break
+        last_id = rows[-1].id
+
+        if dry_run:
+            db.session.rollback()
+            for row in rows:
+                for name in [row.filename, *variant_filenames(row.filename, row.id)]:
+                    try:
+                        reclaimed += storage.path(name).stat().st_size
+                    except OSError:
+                        pass
+        else:
+            db.session.execute(delete(Cover).where(Cover.id.in_([row.id for row in rows])))
+            db.session.commit()
+            for row in rows:
+                reclaimed += remove_cover_files(row.filename, row.id)
+        rows_deleted += len(rows)
+        click.echo(f"unused covers up to id {last_id}: {rows_deleted}")
+
+    referenced = set()
+    for row in db.session.execute(
+        select(Cover.id, Cover.filename).execution_options(yield_per=batch_size)
+    ):
+        referenced.add(row.filename)
+        referenced.update(variant_filenames(row.filename, row.id))
+    db.session.rollback()
+
+    cutoff = time.time() - grace
+    root = storage.root
+    for dirpath, _dirnames, filenames in os.walk(root, topdown=False):
+        for name in filenames:
+            if name.startswith(".") and not name.startswith(".upload-"):
+                continue
+            path = Path(dirpath) / name
+            if path.relative_to(root).as_posix() in referenced:
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if st.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+            files_deleted += 1
+            reclaimed += st.st_size
+            if files_deleted % batch_size == 0:
+                click.echo(f"orphan files: {files_deleted}")
+        if not dry_run and Path(dirpath) != root:
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+
+    prefix = "Would remove" if dry_run else "Removed"
+    click.echo(
+        f"{prefix}: {rows_deleted} unused covers, {files_deleted} orphan files; "
+        f"reclaimed {_format_bytes(reclaimed)}."
+    )
+
+
+books_cli = AppGroup("books", help="Каталог книг: пакетный импорт.")
+
+
+@books_cli.command("import")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "--covers",
+    "covers_dir",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=None,
+    help="Каталог файлов обложек; пути в манифесте — относительно него (по умолчанию — каталог манифеста).",
+)
+@click.option("--format", "fmt", type=click.Choice(["auto", "csv", "jsonl"]), default="auto", show_default=True)
+@click.option("--key", default=None, help="Ключ идемпотентности (по умолчанию — MD5 манифеста).")
+@click.option("--batch-size", type=int, default=1000, show_default=True, help="Записей на транзакцию.")
+@click.option("--workers", type=int, default=None, help="Процессов для хэширования обложек (по умолчанию — число CPU).")
+def books_import(manifest, covers_dir, fmt, key, batch_size, workers) -> None:
+    """
+    Импорт книг из CSV/JSONL-манифеста (title, author, publisher, year, pages,
+    short_description, genres, cover). Прерванный импорт продолжается с места остановки.
+    """
+    from .bulk_import import ManifestError, detect_format, import_catalogue, manifest_key
+
+    try:
+        fmt = detect_format(manifest) if fmt == "auto" else fmt
+    except ManifestError as exc:
+        raise click.UsageError(str(exc)) from None
+    key = key or manifest_key(manifest)
+
+    def report(progress) -> None:
+        for line, message in progress.errors:
+            click.echo(f"{manifest.name}:{line}: {message}", err=True)
+        rate = progress.imported / progress.elapsed if progress.elapsed else 0.0
+        click.echo(
+            f"records {progress.position}: imported={progress.imported} skipped={progress.skipped} "
+            f"({rate:.0f} books/s)"
+        )
+
+    result = import_catalogue(
+        manifest,
+        covers_dir or manifest.parent,
+        key=key,
+        fmt=fmt,
+        batch_size=batch_size,
+        workers=workers,
+        progress=report,
+    )
+    job = result.job
+    if result.already_finished:
+        click.echo(f"Import {key} already finished at {job.finished_at}: imported={job.imported} skipped={job.skipped}.")
+        return
+    if result.unknown_genres:
+        click.echo(f"Unknown genres ignored: {', '.join(result.unknown_genres)}", err=True)
+    click.echo(f"Done: imported={job.imported} skipped={job.skipped}, new covers={result.new_covers} (key {key}).")
+    if result.new_covers:
+        click.echo("Run `flask covers variants` to generate thumbnails for the new covers.")
+
+
+export_cli = AppGroup("export", help="Потоковая выгрузка каталога и рецензий.")
+
+
+def _write_export(dataset: str, fmt: str, compress: bool, output) -> None:
+    from .exports import export_chunks
+
+    started = time.monotonic()
+    written = 0
+    stream = output.open("wb") if output else click.get_binary_stream("stdout")
+    try:
+        for chunk in export_chunks(dataset, fmt, compress):
+            stream.write(chunk)
+            written += len(chunk)
+    finally:
+        if output:
+            stream.close()
+    if output:
+        click.echo(f"{dataset}: {_format_bytes(written)} written to {output} in {time.monotonic() - started:.1f}s.")
+
+
+_export_format = click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv", show_default=True)
+_export_gzip = click.option("--gzip", "compress", is_flag=True, help="Сжимать gzip на лету.")
+_export_output = click.option(
+    "-o", "--output", type=click.Path(dir_okay=False, path_type=Path), default=None,
+    help="Файл выгрузки (по умолчанию — stdout).",
+)
+
+
+@export_cli.command("books")
+@_export_format
+@_export_gzip
+@_export_output
+def export_books(fmt, compress, output) -> None:
+    """Выгрузить книги с жанрами и агрегатами рецензий."""
+    _write_export("books", fmt, compress, output)
+
+
+@export_cli.command("reviews")
+@_export_format
+@_export_gzip
+@_export_output
+def export_reviews(fmt, compress, output) -> None:
+    """Выгрузить рецензии со статусами."""
+    _write_export("reviews", fmt, compress, output)
+
+
+def register_commands(app: Flask) -> None:
+    app.cli.add_command(book_stats_cli)
+    app.cli.add_command(markdown_cli)
+    app.cli.add_command(refdata_cli)
+    app.cli.add_command(covers_cli)
+    app.cli.add_command(books_cli)
+    app.cli.add_command(export_cli)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import select, func
+
+from . import db
+from .models import Book, Review
+from .replicas import primary
+
+
+BOOKS_TOTAL = ("books",)
+
+
+def reviews_by_status(status_id: int) -> Tuple[str, int]:
+    return ("reviews_by_status", status_id)
+
+
+def reviews_by_user(user_id: int) -> Tuple[str, int]:
+    return ("reviews_by_user", user_id)
+
+
+class CounterCache:
+    """
+    Кэш счётчиков для пагинации внутри процесса.
+
+    Записи обновляются приложением после успешного commit (incr/invalidate).
+    Изменения из других процессов и ручные правки в БД подтягиваются сверкой:
+    запись старше ``COUNTER_CACHE_TTL`` секунд пересчитывается при следующем чтении.
+
+    Загрузка идёт вне замка; если за это время ключ менялся (incr/invalidate), результат
+    мог не учесть этот commit и в кэш не кладётся.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values: "OrderedDict[Hashable, Tuple[int, float]]" = OrderedDict()
+        # Ключи, которые сейчас загружаются: [поколение, число загрузчиков]. Поколение
+        # растёт при каждом incr/invalidate ключа.
+        self._loading: Dict[Hashable, List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app: Flask) -> None:
+        self.ttl = float(app.config.get("COUNTER_CACHE_TTL", self.ttl))
+        self.max_entries = int(app.config.get("COUNTER_CACHE_MAX_ENTRIES", self.max_entries))
+        self.clear()
+
+    def get(self, key: Hashable, loader: Callable[[], Optional[int]]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+
+        try:
+            # Значение живёт в кэше процесса до COUNTER_CACHE_TTL и видно всем запросам —
+            # считаем на основной БД, а не на реплике, которая может отставать.
+            with primary():
+                value = int(loader() or 0)
+        finally:
+            with self._lock:
+                loading = self._loading[key]
+                changed = loading[0] != generation
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._loading[key]
+        if changed:
+            return value
+
+        with self._lock:
+            self._values[key] = (value, now)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+        return value
+
+    def _changed(self, key: Hashable) -> None:
+        loading = self._loading.get(key)
+        if loading is not None:
+            loading[0] += 1
+
+    def incr(self, key: Hashable, delta: int = 1) -> None:
+        with self._lock:
+            self._changed(key)
+            entry = self._values.get(key)
+            if entry is not None:
+                self._values[key] = (max(entry[0] + delta, 0), entry[1])
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._changed(key)
+            self._values.pop(key, None)
+
+    def invalidate_group(self, group: str) -> None:
+        def in_group(k) -> bool:
+            return isinstance(k, tuple) and bool(k) and k[0] == group
+
+        with self._lock:
+            for key in [k for k in self._loading if in_group(k)]:
+                self._changed(key)
+            for key in [k for k in self._values if in_group(k)]:
+                del self._values[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._loading):
+                self._changed(key)
+            self._values.clear()
+
+
+counters = CounterCache()
+
+
+def book_total() -> int:
+    return counters.get(BOOKS_TOTAL, lambda: db.session.scalar(select(func.count(Book.id))))
+
+
+def review_total_by_status(status_id: int) -> int:
+    return counters.get(
+        reviews_by_status(status_id),
+        lambda: db.session.scalar(select(func.count(Review.id)).where(Review.status_id == status_id)),
+    )
+
+
+def review_total_by_user(user_id: int) -> int:
+    return counters.get(
+        reviews_by_user(user_id),
+        lambda: db.session.scalar(select(func.count(Review.id)).where(Review.user_id == user_id)),
+    )
+
+
+def review_status_moved(old_status_id: Optional[int], new_status_id: int, n: int = 1) -> None:
+    if old_status_id == new_status_id or not n:
+        return
+    if old_status_id is not None:
+        counters.incr(reviews_by_status(old_status_id), -n)
+    counters.incr(reviews_by_status(new_status_id), n)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import posixpath
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from flask import Blueprint, Flask, Response, abort, current_app, redirect, request, send_from_directory, url_for
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Cover
+from .thumbnails import (
+    VARIANT_FORMATS,
+    VARIANT_SIZES,
+    VARIANTS_VERSION,
+    start_cover_variants,
+    variant_filename,
+    variant_filenames,
+    wait_cover_variants,
+)
+from .utils import cover_storage
+
+covers_bp = Blueprint("covers", __name__)
+
+_MIME_BY_EXT = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+
+def _original_token(cover: Cover) -> str:
+    return cover.md5
+
+
+def _variant_token(cover: Cover) -> str:
+    # Варианты зависят и от исходника, и от набора размеров/качества.
+    return f"{cover.md5}-v{VARIANTS_VERSION}"
+
+
+def cover_url(cover: Cover) -> str:
+    """
+    Адрес оригинала обложки. Хэш содержимого входит в URL, поэтому ответ можно
+    кэшировать навсегда: новое содержимое — новый адрес.
+    """
+    return url_for(
+        "covers.cover_file",
+        cover_id=cover.id,
+        token=_original_token(cover),
+        name=posixpath.basename(cover.filename),
+    )
+
+
+def cover_variant_url(cover: Cover, width: int, height: int, fmt: str) -> str:
+    return url_for(
+        "covers.cover_file",
+        cover_id=cover.id,
+        token=_variant_token(cover),
+        name=posixpath.basename(variant_filename(cover.filename, cover.id, width, height, fmt)),
+    )
+
+
+def _resolve(cover: Cover, name: str) -> Optional[Tuple[str, str, str]]:
+    """
+    (путь относительно COVERS_DIR, актуальный токен, URL) для имени из адреса.
+    """
+    if name == posixpath.basename(cover.filename):
+        return cover.filename, _original_token(cover), cover_url(cover)
+
+    if cover.variants_version != VARIANTS_VERSION:
+        return None
+    for w, h in VARIANT_SIZES:
+        for fmt in VARIANT_FORMATS:
+            path = variant_filename(cover.filename, cover.id, w, h, fmt)
+            if posixpath.basename(path) == name:
+                return path, _variant_token(cover), cover_variant_url(cover, w, h, fmt)
+    return None
+
+
+def remove_cover_files(cover_filename: str, cover_id: int) -> int:
+    """
+    Удаляет оригинал и все варианты обложки; возвращает число освобождённых байт.
+    """
+    storage = cover_storage()
+    reclaimed = 0
+    for name in [cover_filename, *variant_filenames(cover_filename, cover_id)]:
+        path = storage.path(name)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            continue
+        if storage.remove(name):
+            reclaimed += size
+    return reclaimed
+
+
+def schedule_cover_removal(session: Session, cover_filename: str, cover_id: int) -> None:
+    """
+    Файлы удаляются только после успешного commit: при откате строка Cover
+    остаётся вместе со своими файлами.
+    """
+    session.info.setdefault("covers_to_remove", []).append((cover_filename, cover_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_scheduled_covers(session: Session) -> None:
+    pending: List[Tuple[str, int]] = session.info.pop("covers_to_remove", [])
+    for cover_filename, cover_id in pending:
+        try:
+            remove_cover_files(cover_filename, cover_id)
+        except Exception:
+            current_app.logger.warning("Cover %s: failed to remove files", cover_id, exc_info=True)
+
+
+def schedule_cover_variants(session: Session, cover_id: int, cover_filename: str, src_path: Path) -> None:
+    """
+    Варианты новой обложки строятся после commit в пуле процессов, запрос их не ждёт.
+    Пока ``variants_version`` не проставлен, страницы показывают оригинал; обложки,
+    для которых он так и не проставился, доделывает ``flask covers variants --missing``.
+    """
+    session.info.setdefault("covers_to_render", []).append((cover_id, cover_filename, src_path))
+
+
+def _store_variants_version(app: Flask, cover_id: int, futures: List[Future]) -> None:
+    # Вызывается из служебного потока пула, когда все варианты готовы: контекста
+    # приложения здесь нет, сессии запроса — тоже, пишем отдельной короткой транзакцией.
+    with app.app_context():
+        version = wait_cover_variants(cover_id, futures)
+        if version is None:
+            return
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(update(Cover).where(Cover.id == cover_id).values(variants_version=version))
+        except Exception:
+            app.logger.warning("Cover %s: failed to store variants version", cover_id, exc_info=True)
+
+
+def _when_all_done(app: Flask, cover_id: int, futures: List[Future]) -> None:
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_future: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _store_variants_version(app, cover_id, futures)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+@event.listens_for(Session, "after_commit")
+def _render_scheduled_variants(session: Session) -> None:
+    pending: List[Tuple[int, str, Path]] = session.info.pop("covers_to_render", [])
+    if not pending:
+        return
+    app = current_app._get_current_object()
+    for cover_id, cover_filename, src_path in pending:
+        try:
+            futures = start_cover_variants(cover_id, cover_filename, src_path)
+        except Exception:
+            current_app.logger.warning("Cover %s: failed to schedule variants", cover_id, exc_info=True)
+            continue
+        _when_all_done(app, cover_id, futures)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_scheduled_covers(session: Session) -> None:
+    session.info.pop("covers_to_remove", None)
+    session.info.pop("covers_to_render", None)
+
+
+def _cache_forever(resp: Response, etag: str) -> Response:
+    max_age = int(current_app.config.get("COVER_CACHE_MAX_AGE", 365 * 24 * 3600))
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = None
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    resp.cache_control.immutable = True
+    resp.expires = datetime.now(timezone.utc) + timedelta(seconds=max_age)
+    return resp
+
+
+@covers_bp.get("/covers/<int:cover_id>/<token>/<name>")
+def cover_file(cover_id: int, token: str, name: str):
+    etag = f"{token}/{name}"
+
+    # Содержимое по этому адресу никогда не меняется: если у клиента есть
+    # копия с таким ETag, она актуальна — ни БД, ни файл не трогаем.
+    if etag in request.if_none_match:
+        return _cache_forever(Response(status=304), etag)
+
+    cover = db.session.get(Cover, cover_id)
+    if cover is None:
+        abort(404)
+
+    resolved = _resolve(cover, name)
+    if resolved is None:
+        abort(404)
+    rel_path, actual_token, actual_url = resolved
+    if token != actual_token:
+        return redirect(actual_url)
+
+    mime_type = _MIME_BY_EXT.get(posixpath.splitext(rel_path)[1].lower(), cover.mime_type)
+
+    accel_prefix = current_app.config.get("COVERS_ACCEL_REDIRECT")
+    if accel_prefix:
+        # За nginx: файл отдаёт сам nginx из internal-location, смотрящего в COVERS_DIR.
+        resp = Response(mimetype=mime_type)
+        resp.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + rel_path
+        return _cache_forever(resp, etag)
+
+    # send_file сам использует wsgi.file_wrapper (sendfile) или X-Sendfile при USE_X_SENDFILE.
+    resp = send_from_directory(current_app.config["COVERS_DIR"], rel_path, mimetype=mime_type, etag=False, conditional=True)
+    return _cache_forever(resp, etag)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, Sequence, Tuple
+
+from flask import Blueprint, Response, request, stream_with_context
+from sqlalchemy import func, select
+
+from . import db
+from .decorators import role_required
+from .models import Book, BookGenre, BookStats, Review, ReviewStatus, User
+from .refdata import refdata
+
+exports_bp = Blueprint("exports", __name__)
+
+# Строк в одной пачке выгрузки (WHERE id > :last ORDER BY id LIMIT n).
+EXPORT_BATCH_SIZE = 1000
+# Сколько текста копить перед отправкой клиенту (и перед сжатием).
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+Row = Dict[str, object]
+
+
+def _keyset_batches(stmt, key) -> Iterator:
+    """
+    Строки ``stmt`` по возрастанию ``key`` пачками по EXPORT_BATCH_SIZE. Каждая пачка —
+    отдельный запрос с LIMIT: mysql-connector серверных курсоров не умеет и буферизует
+    результат целиком, так что в памяти одновременно не больше одной пачки.
+    """
+    last = None
+    while True:
+        batch = stmt.order_by(key).limit(EXPORT_BATCH_SIZE)
+        if last is not None:
+            batch = batch.where(key > last)
+        rows = db.session.execute(batch).all()
+        yield from rows
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        last = getattr(rows[-1], key.key)
+        db.session.expunge_all()
+
+
+def _id_list(raw) -> list:
+    if not raw:
+        return []
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("ascii")
+    return sorted(int(i) for i in str(raw).split(","))
+
+
+def _avg(rating_sum: int, count: int):
+    return round(rating_sum / count, 2) if count else None
+
+
+BOOK_FIELDS = (
+    "id", "title", "author", "publisher", "year", "pages", "genres",
+    "reviews_count", "approved_count", "avg_rating",
+)
+
+
+def book_rows() -> Iterator[Row]:
+    genre_names = {g.id: g.name for g in refdata.genres()}
+    # Жанры — коррелированным подзапросом, чтобы пачка оставалась одним запросом.
+    genre_ids = (
+        select(func.group_concat(BookGenre.genre_id))
+        .where(BookGenre.book_id == Book.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            Book.id, Book.title, Book.author, Book.publisher, Book.year, Book.pages,
+            genre_ids.label("genre_ids"),
+            func.coalesce(BookStats.reviews_count, 0).label("reviews_count"),
+            func.coalesce(BookStats.approved_count, 0).label("approved_count"),
+            func.coalesce(BookStats.approved_rating_sum, 0).label("approved_rating_sum"),
+        )
+        .outerjoin(BookStats, BookStats.book_id == Book.id)
+    )
+    for row in _keyset_batches(stmt, Book.id):
+        yield {
+            "id": row.id,
+            "title": row.title,
+            "author": row.author,
+            "publisher": row.publisher,
+            "year": row.year,
+            "pages": row.pages,
+            "genres": [genre_names.get(i, str(i)) for i in _id_list(row.genre_ids)],
+            "reviews_count": row.reviews_count,
+            "approved_count": row.approved_count,
+            "avg_rating": _avg(row.approved_rating_sum, row.approved_count),
+        }
+
+
+REVIEW_FIELDS = ("id", "book_id", "book_title", "user_id", "username", "rating", "status", "created_at", "text")
+
+
+def review_rows() -> Iterator[Row]:
+    stmt = (
+        select(
+            Review.id, Review.book_id, Book.title.label("book_title"), Review.user_id, User.username,
+            Review.rating, ReviewStatus.name.label("status"), Review.created_at, Review.text,
+        )
+        .join(Book, Book.id == Review.book_id)
+        .join(User, User.id == Review.user_id)
+        .join(ReviewStatus, ReviewStatus.id == Review.status_id)
+    )
+    for row in _keyset_batches(stmt, Review.id):
+        item = dict(row._mapping)
+        item["created_at"] = row.created_at.isoformat() if row.created_at else None
+        yield item
+
+
+DATASETS: Dict[str, Tuple[Callable[[], Iterator[Row]], Sequence[str]]] = {
+    "books": (book_rows, BOOK_FIELDS),
+    "reviews": (review_rows, REVIEW_FIELDS),
+}
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return "; ".join(value)
+    return value
+
+
+def _text_chunks(rows: Iterable[Row], fields: Sequence[str], fmt: str) -> Iterator[str]:
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buf)
+        writer.writerow(fields)
+        write = lambda row: writer.writerow([_csv_value(row[f]) for f in fields])  # noqa: E731
+    else:
+        write = lambda row: buf.write(json.dumps(row, ensure_ascii=False) + "\n")  # noqa: E731
+
+    for row in rows:
+        write(row)
+        if buf.tell() >= EXPORT_CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def export_chunks(dataset: str, fmt: str, compress: bool = False) -> Iterator[bytes]:
+    """
+    Выгрузка набора ``dataset`` в CSV/JSONL кусками байт; с ``compress`` —
+    сразу в gzip, без промежуточного файла.
+    """
+    make_rows, fields = DATASETS[dataset]
+    chunks = (chunk.encode("utf-8") for chunk in _text_chunks(make_rows(), fields, fmt))
+    if not compress:
+        yield from chunks
+        return
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = gz.compress(chunk)
+        if data:
+            yield data
+    yield gz.flush()
+
+
+_CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+
+
+def export_filename(dataset: str, fmt: str, compress: bool) -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return f"{dataset}-{stamp}.{fmt}" + (".gz" if compress else "")
+
+
+@exports_bp.get("/admin/export/<any(books, reviews):dataset>.<any(csv, jsonl):fmt>")
+@role_required("Admin")
+def export(dataset: str, fmt: str):
+    compress = request.args.get("gzip") == "1"
+    response = Response(
+        stream_with_context(export_chunks(dataset, fmt, compress)),
+        content_type="application/gzip" if compress else _CONTENT_TYPES[fmt],
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{export_filename(dataset, fmt, compress)}"'
+    response.headers["Cache-Control"] = "no-store"
+    # Не даём nginx буферизовать ответ целиком — выгрузка идёт клиенту по мере чтения.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
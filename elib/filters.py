@@ -3,7 +3,9 @@ from __future__ import annotations
 from markupsafe import Markup
 from flask import Flask
 
-from .utils import markdown_to_html_safe
+from .covers import cover_url as _cover_url, cover_variant_url as _cover_variant_url
+from .thumbnails import VARIANT_SIZES, VARIANTS_VERSION
+from .utils import markdown_to_html_safe, stored_markdown_html
 
 
 def register_filters(app: Flask) -> None:
@@ -13,3 +15,27 @@ def register_filters(app: Flask) -> None:
     def _markdown_filter(text: str) -> Markup:
         html = markdown_to_html_safe(text or "")
         return Markup(html)
+
+    @app.template_filter("review_html")
+    def _review_html_filter(review) -> Markup:
+        html = stored_markdown_html(review.text, review.text_html, review.text_render_version)
+        return Markup(html)
+
+    @app.template_global()
+    def cover_variants_ready(cover) -> bool:
+        return bool(cover and cover.variants_version == VARIANTS_VERSION)
+
+    @app.template_global()
+    def cover_url(cover) -> str:
+        return _cover_url(cover)
+
+    @app.template_global()
+    def cover_variant_url(cover, width: int, height: int, fmt: str) -> str:
+        return _cover_variant_url(cover, width, height, fmt)
+
+    @app.template_global()
+    def cover_srcset(cover, width: int, height: int, fmt: str) -> str:
+        parts = [f"{cover_variant_url(cover, width, height, fmt)} 1x"]
+        if (width * 2, height * 2) in VARIANT_SIZES:
+            parts.append(f"{cover_variant_url(cover, width * 2, height * 2, fmt)} 2x")
+        return ", ".join(parts)
@@ -7,19 +7,17 @@ from flask_login import UserMixin
 from sqlalchemy import (
     CheckConstraint,
     UniqueConstraint,
+    Index,
     Integer,
     String,
     Text,
     ForeignKey,
-    select,
     func,
-    and_,
 )
 from sqlalchemy.orm import (
     Mapped,
     mapped_column,
     relationship,
-    column_property,
 )
 
 from . import db
@@ -32,6 +30,46 @@ TABLE_KW = {
 }
 
 
+class DataVersion(db.Model):
+    """
+    Счётчики версий данных, по которым процессы сбрасывают свои кэши.
+    """
+    __tablename__ = "data_versions"
+    __table_args__ = (TABLE_KW,)
+
+    REFDATA = "refdata"
+    CATALOGUE = "catalogue"
+    PRINCIPALS = "principals"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self) -> str:
+        return f"<DataVersion name={self.name!r} version={self.version}>"
+
+
+class ImportJob(db.Model):
+    """
+    Ход пакетного импорта каталога (``flask books import``): повторный запуск с тем же
+    ключом продолжает с первой записи манифеста, не попавшей в закоммиченную пачку.
+    """
+    __tablename__ = "import_jobs"
+    __table_args__ = (TABLE_KW,)
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    source: Mapped[str] = mapped_column(String(255), nullable=False)
+    position: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    imported: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    skipped: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(
+        default=None, server_default=func.current_timestamp(), nullable=False
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<ImportJob key={self.key!r} position={self.position} finished={self.finished_at is not None}>"
+
+
 class Role(db.Model):
     __tablename__ = "roles"
     __table_args__ = (TABLE_KW,)
@@ -64,7 +102,10 @@ class User(UserMixin, db.Model):
     role: Mapped["Role"] = relationship(back_populates="users")
 
     reviews: Mapped[List["Review"]] = relationship(
-        back_populates="user", cascade="all,delete-orphan", passive_deletes=True
+        back_populates="user",
+        cascade="all,delete-orphan",
+        passive_deletes=True,
+        foreign_keys="Review.user_id",
     )
 
     def get_id(self) -> str:
@@ -90,6 +131,7 @@ class Cover(db.Model):
     filename: Mapped[str] = mapped_column(String(255), nullable=False)
     mime_type: Mapped[str] = mapped_column(String(100), nullable=False)
     md5: Mapped[str] = mapped_column(String(32), unique=True, nullable=False)
+    variants_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     book: Mapped[Optional["Book"]] = relationship(back_populates="cover", uselist=False)
 
@@ -117,16 +159,23 @@ class Book(db.Model):
     __table_args__ = (
         CheckConstraint("year BETWEEN 1000 AND 2100", name="chk_books_year"),
         CheckConstraint("pages > 0", name="chk_books_pages"),
+        Index("ix_books_year_id", "year", "id"),
+        Index("ix_books_import_key", "import_key", unique=True),
+        Index("ft_books_search", "title", "author", "publisher", "short_description", mysql_prefix="FULLTEXT"),
         TABLE_KW,
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     short_description: Mapped[str] = mapped_column(Text, nullable=False)
+    short_description_html: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    short_description_render_version: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
     year: Mapped[int] = mapped_column(Integer, nullable=False)
     publisher: Mapped[str] = mapped_column(String(255), nullable=False)
     author: Mapped[str] = mapped_column(String(255), nullable=False)
     pages: Mapped[int] = mapped_column(Integer, nullable=False)
+    # "<ключ импорта>:<строка манифеста>" для книг из `flask books import`, иначе NULL.
+    import_key: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
     cover_id: Mapped[int] = mapped_column(
         ForeignKey("covers.id", onupdate="RESTRICT", ondelete="RESTRICT"),
@@ -142,10 +191,55 @@ class Book(db.Model):
         back_populates="book", cascade="all,delete-orphan", passive_deletes=True
     )
 
+    stats: Mapped[Optional["BookStats"]] = relationship(
+        back_populates="book",
+        uselist=False,
+        lazy="joined",
+        cascade="all,delete-orphan",
+        passive_deletes=True,
+    )
+
+    @property
+    def reviews_count(self) -> int:
+        return self.stats.reviews_count if self.stats else 0
+
+    @property
+    def reviews_count_approved(self) -> int:
+        return self.stats.approved_count if self.stats else 0
+
+    @property
+    def avg_rating_approved(self) -> Optional[float]:
+        if not self.stats or not self.stats.approved_count:
+            return None
+        return self.stats.approved_rating_sum / self.stats.approved_count
+
     def __repr__(self) -> str:
         return f"<Book id={self.id} title={self.title!r} year={self.year}>"
 
 
+class BookStats(db.Model):
+    """
+    Агрегаты рецензий по книге, поддерживаются инкрементально (см. elib/stats.py).
+    """
+    __tablename__ = "book_stats"
+    __table_args__ = (TABLE_KW,)
+
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("books.id", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True
+    )
+    reviews_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    approved_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    approved_rating_sum: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+    book: Mapped["Book"] = relationship(back_populates="stats")
+
+    def __repr__(self) -> str:
+        return (
+            f"<BookStats book_id={self.book_id} reviews={self.reviews_count} "
+            f"approved={self.approved_count} sum={self.approved_rating_sum}>"
+        )
+
+
 class BookGenre(db.Model):
     __tablename__ = "book_genres"
     __table_args__ = (
@@ -171,6 +265,10 @@ class ReviewStatus(db.Model):
     __tablename__ = "review_statuses"
     __table_args__ = (TABLE_KW,)
 
+    PENDING = "На рассмотрении"
+    APPROVED = "Одобрена"
+    REJECTED = "Отклонена"
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
 
@@ -185,6 +283,8 @@ class Review(db.Model):
     __table_args__ = (
         CheckConstraint("rating BETWEEN 0 AND 5", name="chk_reviews_rating"),
         UniqueConstraint("book_id", "user_id", name="uq_reviews_book_user"),
+        Index("ix_reviews_status_created", "status_id", "created_at"),
+        Index("ix_reviews_book_status_created", "book_id", "status_id", "created_at", "id"),
         TABLE_KW,
     )
 
@@ -201,6 +301,8 @@ class Review(db.Model):
 
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
     text: Mapped[str] = mapped_column(Text, nullable=False)
+    text_html: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    text_render_version: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         default=None, server_default=func.current_timestamp(), nullable=False
     )
@@ -210,9 +312,17 @@ class Review(db.Model):
         nullable=False,
     )
 
+    # Аренда рецензии модератором: пока срок не истёк, другие её не забирают.
+    claimed_by_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("users.id", onupdate="CASCADE", ondelete="SET NULL"),
+        nullable=True,
+    )
+    claim_expires_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
     book: Mapped["Book"] = relationship(back_populates="reviews")
-    user: Mapped["User"] = relationship(back_populates="reviews")
+    user: Mapped["User"] = relationship(back_populates="reviews", foreign_keys=[user_id])
     status: Mapped["ReviewStatus"] = relationship(back_populates="reviews")
+    claimed_by: Mapped[Optional["User"]] = relationship(foreign_keys=[claimed_by_id])
 
     RATING_LABELS = {
         5: "отлично",
@@ -223,6 +333,9 @@ class Review(db.Model):
         0: "ужасно",
     }
 
+    def is_claimed(self, now: datetime) -> bool:
+        return bool(self.claimed_by_id and self.claim_expires_at and self.claim_expires_at > now)
+
     @property
     def rating_label(self) -> str:
         return self.RATING_LABELS.get(self.rating, str(self.rating))
@@ -230,33 +343,3 @@ class Review(db.Model):
     def __repr__(self) -> str:
         return f"<Review id={self.id} book_id={self.book_id} user_id={self.user_id} rating={self.rating}>"
 
-
-Book.avg_rating = column_property(
-    select(func.avg(Review.rating))
-    .where(Review.book_id == Book.id)
-    .correlate_except(Review)
-    .scalar_subquery()
-)
-
-Book.reviews_count = column_property(
-    select(func.count(Review.id))
-    .where(Review.book_id == Book.id)
-    .correlate_except(Review)
-    .scalar_subquery()
-)
-
-approved_status_id_sq = select(ReviewStatus.id).where(ReviewStatus.name == "Одобрена").scalar_subquery()
-
-Book.avg_rating_approved = column_property(
-    select(func.avg(Review.rating))
-    .where(and_(Review.book_id == Book.id, Review.status_id == approved_status_id_sq))
-    .correlate_except(Review)
-    .scalar_subquery()
-)
-
-Book.reviews_count_approved = column_property(
-    select(func.count(Review.id))
-    .where(and_(Review.book_id == Book.id, Review.status_id == approved_status_id_sq))
-    .correlate_except(Review)
-    .scalar_subquery()
-)
\ No newline at end of file
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import db
+from .models import DataVersion, Role, User
+
+
+@dataclass(frozen=True)
+class PrincipalRow:
+    """Неизменяемый снимок строки пользователя с ролью — то, что лежит в кэше."""
+
+    id: int
+    username: str
+    password_hash: str
+    last_name: str
+    first_name: str
+    middle_name: Optional[str]
+    role_id: int
+    role_name: Optional[str]
+    role_description: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "PrincipalRow":
+        role = user.role
+        return cls(
+            id=user.id,
+            username=user.username,
+            password_hash=user.password_hash,
+            last_name=user.last_name,
+            first_name=user.first_name,
+            middle_name=user.middle_name,
+            role_id=user.role_id,
+            role_name=role.name if role else None,
+            role_description=role.description if role else None,
+        )
+
+    def to_user(self) -> User:
+        """
+        Новый ``User`` для текущего запроса, присоединённый к его сессии без обращения к БД:
+        у каждого запроса свой объект, ленивые загрузки идут через его сессию.
+        """
+        user = User(
+            id=self.id,
+            username=self.username,
+            password_hash=self.password_hash,
+            last_name=self.last_name,
+            first_name=self.first_name,
+            middle_name=self.middle_name,
+            role_id=self.role_id,
+        )
+        make_transient_to_detached(user)
+        if self.role_name is not None:
+            role = Role(id=self.role_id, name=self.role_name, description=self.role_description)
+            make_transient_to_detached(role)
+            # Как будто роль пришла из БД вместе с пользователем: без истории и обратной ссылки.
+            set_committed_value(user, "role", role)
+        return db.session.merge(user, load=False)
+
+
+class PrincipalCache:
+    """
+    Короткоживущий кэш пользователей (вместе с ролью) для user_loader.
+
+    Хранятся неизменяемые :class:`PrincipalRow`, объект ``User`` строится заново на
+    каждый запрос. Изменение пользователя или роли повышает версию
+    ``data_versions['principals']`` в той же транзакции; процессы сверяют её не чаще
+    раза в ``PRINCIPAL_CHECK_INTERVAL`` секунд и при расхождении сбрасывают кэш.
+    ``PRINCIPAL_CACHE_TTL = 0`` отключает кэш.
+    """
+
+    def __init__(self, ttl: float = 0.0, check_interval: float = 5.0, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[PrincipalRow, float]] = {}
+        self._version: Optional[int] = None
+        self._checked_at = float("-inf")
+
+    def init_app(self, app: Flask) -> None:
+        self.ttl = float(app.config.get("PRINCIPAL_CACHE_TTL", self.ttl))
+        self.check_interval = float(app.config.get("PRINCIPAL_CHECK_INTERVAL", self.check_interval))
+        self.max_entries = int(app.config.get("PRINCIPAL_CACHE_MAX_ENTRIES", self.max_entries))
+        self.invalidate()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def _current_version() -> int:
+        return db.session.scalar(
+            select(DataVersion.version).where(DataVersion.name == DataVersion.PRINCIPALS)
+        ) or 0
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        version = self._current_version()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._checked_at = now
+
+    def get(self, user_id: int) -> Optional[PrincipalRow]:
+        self._ensure_fresh()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= now:
+                return None
+            return entry[0]
+
+    def put(self, row: PrincipalRow) -> None:
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                for key in [k for k, (_r, exp) in self._entries.items() if exp <= now]:
+                    del self._entries[key]
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[row.id] = (row, expires)
+
+    def invalidate(self) -> None:
+        """Сбросить кэш процесса; версия будет перечитана при следующем обращении."""
+        with self._lock:
+            self._entries.clear()
+            self._checked_at = float("-inf")
+
+
+principals = PrincipalCache()
+
+
+def load_principal(user_id: int) -> Optional[User]:
+    if principals.enabled:
+        row = principals.get(user_id)
+        if row is not None:
+            return row.to_user()
+
+    user = db.session.scalar(select(User).options(joinedload(User.role)).where(User.id == user_id))
+    if user is not None and principals.enabled:
+        principals.put(PrincipalRow.from_user(user))
+    return user
+
+
+def _touches_principals(session: Session) -> bool:
+    for obj in session.deleted:
+        if isinstance(obj, (User, Role)):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, (User, Role)) and session.is_modified(obj, include_collections=False):
+            return True
+    return False
+
+
+def _bump_principals_version(session: Session) -> None:
+    # Core-запросом на соединении сессии: событие срабатывает посреди flush.
+    # Строку создаёт миграция b5d18e3c4f20; вставка — только на случай БД без неё.
+    table = DataVersion.__table__
+    conn = session.connection()
+    bump = update(table).where(table.c.name == DataVersion.PRINCIPALS).values(version=table.c.version + 1)
+    if conn.execute(bump).rowcount:
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(table).values(name=DataVersion.PRINCIPALS, version=1))
+    except IntegrityError:
+        # Строку только что вставила параллельная транзакция — повышаем её версию.
+        conn.execute(bump)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_principal_changes(session: Session, _flush_context, _instances) -> None:
+    if _touches_principals(session):
+        session.info["principals_changed"] = True
+        _bump_principals_version(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_principals(session: Session) -> None:
+    if session.info.pop("principals_changed", False):
+        principals.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_principals(session: Session) -> None:
+    session.info.pop("principals_changed", None)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from flask import Flask
+from sqlalchemy import select, update
+
+from . import db
+from .models import DataVersion, Genre, ReviewStatus, Role
+
+
+@dataclass(frozen=True)
+class GenreRef:
+    id: int
+    name: str
+
+
+class ReferenceData:
+    """
+    Справочники (статусы рецензий, роли, жанры), загруженные один раз на процесс.
+
+    Перезагружаются, когда меняется строка ``data_versions['refdata']``; её версия
+    проверяется не чаще раза в ``REFDATA_CHECK_INTERVAL`` секунд.
+    """
+
+    def __init__(self, check_interval: float = 30.0) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._status_ids: Dict[str, int] = {}
+        self._role_ids: Dict[str, int] = {}
+        self._genres: List[GenreRef] = []
+        self._genre_ids: frozenset = frozenset()
+
+    def init_app(self, app: Flask) -> None:
+        self.check_interval = float(app.config.get("REFDATA_CHECK_INTERVAL", self.check_interval))
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+
+    def _current_version(self) -> int:
+        return db.session.scalar(
+            select(DataVersion.version).where(DataVersion.name == DataVersion.REFDATA)
+        ) or 0
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._loaded and now - self._checked_at < self.check_interval:
+                return
+            version = self._current_version()
+            if not self._loaded or version != self._version:
+                self._reload()
+                self._version = version
+                self._loaded = True
+            self._checked_at = now
+
+    def _reload(self) -> None:
+        self._status_ids = dict(
+            (name, id_) for id_, name in db.session.execute(select(ReviewStatus.id, ReviewStatus.name))
+        )
+        self._role_ids = dict((name, id_) for id_, name in db.session.execute(select(Role.id, Role.name)))
+        self._genres = [
+            GenreRef(id=id_, name=name)
+            for id_, name in db.session.execute(select(Genre.id, Genre.name).order_by(Genre.name.asc()))
+        ]
+        self._genre_ids = frozenset(g.id for g in self._genres)
+
+    def version(self) -> int:
+        """Версия справочников, по которой загружены текущие данные (для ETag и т. п.)."""
+        self._ensure_fresh()
+        return self._version or 0
+
+    def status_id(self, name: str) -> Optional[int]:
+        self._ensure_fresh()
+        return self._status_ids.get(name)
+
+    def role_id(self, name: str) -> Optional[int]:
+        self._ensure_fresh()
+        return self._role_ids.get(name)
+
+    def genres(self) -> List[GenreRef]:
+        self._ensure_fresh()
+        return self._genres
+
+    def valid_genre_ids(self, raw_ids: Iterable) -> List[int]:
+        self._ensure_fresh()
+        ids = {int(g) for g in raw_ids if str(g).isdigit()}
+        return sorted(ids & self._genre_ids)
+
+
+refdata = ReferenceData()
+
+
+def bump_refdata_version() -> None:
+    """
+    Отметить изменение справочников в текущей транзакции (вызывается перед commit).
+    """
+    result = db.session.execute(
+        update(DataVersion)
+        .where(DataVersion.name == DataVersion.REFDATA)
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(DataVersion(name=DataVersion.REFDATA, version=1))
+    refdata.invalidate()
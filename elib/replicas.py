@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional
+
+from flask import Flask, Response, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Метка в cookie-сессии: до этого времени (unix) клиент читает только с основной БД.
+_PRIMARY_UNTIL = "db_primary_until"
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Ключ в Session.info: реплика, закреплённая за сессией (None — реплик нет, читаем с основной).
+_REPLICA = "db_replica_engine"
+
+
+class ReplicaPool:
+    """
+    Реплики только для чтения из ``SQLALCHEMY_REPLICA_URLS``.
+
+    Каждая реплика — отдельный bind Flask-SQLAlchemy (``replica_0``, ``replica_1``, …);
+    сессии (т. е. HTTP-запросы) распределяются по кругу между доступными, и все чтения
+    одной сессии идут на одну реплику. Доступность проверяется
+    ``SELECT 1`` не чаще раза в ``REPLICA_CHECK_INTERVAL`` секунд; реплика, на которой
+    оборвалось соединение, сразу считается недоступной до следующей проверки.
+    Если доступных нет, читаем с основной БД.
+    """
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self.check_interval = 10.0
+        self.read_after_write = 5.0
+        # RLock: неудачный ping вызывает handle_error, который тоже берёт замок.
+        self._lock = threading.RLock()
+        self._up: Dict[str, bool] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._listening: set = set()
+        self._next = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keys)
+
+    def init_app(self, app: Flask) -> None:
+        """Вызывается до ``db.init_app``: реплики добавляются в SQLALCHEMY_BINDS."""
+        urls = [url for url in app.config.get("SQLALCHEMY_REPLICA_URLS") or () if url]
+        self.check_interval = float(app.config.get("REPLICA_CHECK_INTERVAL", self.check_interval))
+        self.read_after_write = float(app.config.get("REPLICA_READ_AFTER_WRITE", self.read_after_write))
+        self.keys = [f"replica_{i}" for i in range(len(urls))]
+        self._up.clear()
+        self._checked_at.clear()
+        if not urls:
+            return
+
+        binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+        binds.update(zip(self.keys, urls))
+        app.config["SQLALCHEMY_BINDS"] = binds
+        app.after_request(self._remember_write)
+
+    def _engine(self, key: str) -> Engine:
+        from . import db
+
+        engine = db.engines[key]
+        if key not in self._listening:
+            with self._lock:
+                if key not in self._listening:
+                    event.listen(engine, "handle_error", lambda context: self._on_error(key, context))
+                    self._listening.add(key)
+        return engine
+
+    def _on_error(self, key: str, context) -> None:
+        if context.is_disconnect or context.connection is None:
+            with self._lock:
+                self._up[key] = False
+                self._checked_at[key] = time.monotonic()
+
+    @staticmethod
+    def _ping(engine: Engine) -> bool:
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _healthy(self, key: str, engine: Engine) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at.get(key, float("-inf")) < self.check_interval:
+            return self._up.get(key, False)
+        with self._lock:
+            if now - self._checked_at.get(key, float("-inf")) >= self.check_interval:
+                self._up[key] = self._ping(engine)
+                self._checked_at[key] = time.monotonic()
+            return self._up[key]
+
+    def pick(self) -> Optional[Engine]:
+        """Следующая доступная реплика или None — тогда читаем с основной БД."""
+        n = len(self.keys)
+        start = next(self._next)
+        for i in range(n):
+            key = self.keys[(start + i) % n]
+            engine = self._engine(key)
+            if self._healthy(key, engine):
+                return engine
+        return None
+
+    def _remember_write(self, response: Response) -> Response:
+        # После POST и редиректа клиент должен увидеть свои изменения, а реплика
+        # может отставать — несколько секунд его чтения идут на основную БД.
+        if request.method not in _SAFE_METHODS:
+            session[_PRIMARY_UNTIL] = int(time.time() + self.read_after_write) + 1
+        return response
+
+    def recently_wrote(self) -> bool:
+        return session.get(_PRIMARY_UNTIL, 0) > time.time()
+
+
+replicas = ReplicaPool()
+
+
+def prefer_replica() -> None:
+    """Разрешить чтение с реплики до конца текущего запроса (только GET/HEAD)."""
+    if replicas.enabled and request.method in ("GET", "HEAD") and not replicas.recently_wrote():
+        g.db_replica = True
+
+
+def reads_from_replica(view_func: Callable) -> Callable:
+    """Представление только читает данные — его SELECT'ы можно отправить на реплику."""
+
+    @wraps(view_func)
+    def wrapped(*args, **kwargs):
+        prefer_replica()
+        return view_func(*args, **kwargs)
+
+    return wrapped
+
+
+@contextmanager
+def primary() -> Iterator[None]:
+    """Внутри блока все запросы идут на основную БД, даже в представлении для реплик."""
+    if not has_request_context() or not g.get("db_replica"):
+        yield
+        return
+    g.db_replica = False
+    try:
+        yield
+    finally:
+        g.db_replica = True
+
+
+class RoutingSession(Session):
+    """
+    Сессия, отправляющая на реплику SELECT'ы представлений с :func:`reads_from_replica`.
+
+    Запись (flush, INSERT/UPDATE/DELETE), SELECT ... FOR UPDATE и чтение при
+    несохранённых изменениях в сессии всегда идут на основную БД.
+
+    Реплика выбирается один раз на сессию: реплики отстают по-разному, и список
+    со своим счётчиком, прочитанные с разных, могли бы не сойтись.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            if _REPLICA not in self.info:
+                self.info[_REPLICA] = replicas.pick()
+            engine = self.info[_REPLICA]
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause) -> bool:
+        if not has_request_context() or not g.get("db_replica"):
+            return False
+        if clause is None or not getattr(clause, "is_select", False):
+            return False
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        return not (self._flushing or self.new or self.dirty or self.deleted)
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
 from flask import (
     Blueprint,
     render_template,
@@ -10,18 +13,104 @@ from flask import (
     current_app,
 )
 from flask_login import current_user
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, update, func, desc, or_, and_
 from sqlalchemy.orm import joinedload
 
 from . import db
 from .models import Book, Review, ReviewStatus, User
 from .decorators import any_authenticated, roles_required
-from .utils import markdown_to_html_safe, parse_page_arg
+from .utils import (
+    parse_page_arg,
+    encode_cursor,
+    decode_cursor,
+    render_markdown_for_storage,
+    stored_markdown_html,
+)
+from .refdata import refdata
+from .replicas import reads_from_replica
+from .stats import (
+    on_review_created,
+    on_review_status_changed,
+    on_reviews_approved,
+    recalculate_book_stats,
+)
+from .counters import (
+    counters,
+    reviews_by_status,
+    reviews_by_user,
+    review_total_by_status,
+    review_total_by_user,
+    review_status_moved,
+)
 
 
 reviews_bp = Blueprint("reviews", __name__)
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _created_at_to_cursor(value: datetime) -> int:
+    return (value.replace(tzinfo=None) - _EPOCH) // timedelta(microseconds=1)
+
+
+def review_cursor(created_at: datetime, review_id: int) -> str:
+    return encode_cursor(_created_at_to_cursor(created_at), review_id)
+
+
+def approved_reviews_where(book_id: int, approved_id: int, after: Optional[Tuple[int, ...]] = None) -> list:
+    """
+    Условия страницы одобренных рецензий книги для ключа (created_at desc, id desc).
+    """
+    clauses = [Review.book_id == book_id, Review.status_id == approved_id]
+    if after:
+        created_at = _EPOCH + timedelta(microseconds=after[0])
+        clauses.append(
+            or_(
+                Review.created_at < created_at,
+                and_(Review.created_at == created_at, Review.id < after[1]),
+            )
+        )
+    return clauses
+
+
+def approved_reviews_page(
+    book_id: int, after: Optional[Tuple[int, ...]] = None, exclude_id: Optional[int] = None
+) -> Tuple[List[Review], Optional[str]]:
+    """
+    Страница одобренных рецензий книги по ключу (created_at desc, id desc) и курсор следующей.
+    """
+    approved_id = refdata.status_id(ReviewStatus.APPROVED)
+    if not approved_id:
+        return [], None
+    page_size = current_app.config.get("REVIEWS_PAGE_SIZE", 20)
+
+    stmt = (
+        select(Review)
+        .options(joinedload(Review.user))
+        .where(*approved_reviews_where(book_id, approved_id, after))
+        .order_by(desc(Review.created_at), desc(Review.id))
+        .limit(page_size + 1)
+    )
+    if exclude_id:
+        stmt = stmt.where(Review.id != exclude_id)
+
+    items = db.session.scalars(stmt).all()
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = review_cursor(items[-1].created_at, items[-1].id)
+    return items, next_cursor
+
+
+def find_user_review(book_id: int, user_id: int) -> Optional[Review]:
+    return db.session.scalar(
+        select(Review)
+        .options(joinedload(Review.user))
+        .where(Review.book_id == book_id, Review.user_id == user_id)
+    )
+
+
 def _user_already_reviewed(book_id: int, user_id: int) -> bool:
     exists = db.session.scalar(
         select(Review.id).where(Review.book_id == book_id, Review.user_id == user_id).limit(1)
@@ -29,6 +118,21 @@ def _user_already_reviewed(book_id: int, user_id: int) -> bool:
     return bool(exists)
 
 
+@reviews_bp.get("/books/<int:book_id>/reviews")
+@reads_from_replica
+def book_reviews_more(book_id: int):
+    after = decode_cursor(request.args.get("after"), 2)
+    exclude_id = request.args.get("exclude", type=int)
+    reviews, next_cursor = approved_reviews_page(book_id, after=after, exclude_id=exclude_id)
+    return render_template(
+        "_review_cards.html",
+        book_id=book_id,
+        reviews=reviews,
+        next_cursor=next_cursor,
+        exclude_id=exclude_id,
+    )
+
+
 @reviews_bp.get("/books/<int:book_id>/reviews/new")
 @any_authenticated()
 def review_new(book_id: int):
@@ -70,22 +174,26 @@ def review_create(book_id: int):
         return render_template("review_form.html", book=book, default_rating=rating), 400
 
     try:
-        pending_id = db.session.scalar(
-            select(ReviewStatus.id).where(ReviewStatus.name == "На рассмотрении")
-        )
+        pending_id = refdata.status_id(ReviewStatus.PENDING)
         if not pending_id:
             flash("Системная ошибка: статусы рецензий не инициализированы.", "danger")
             return render_template("review_form.html", book=book, default_rating=rating), 500
 
+        text_html, render_version = render_markdown_for_storage(text_raw)
         review = Review(
             book_id=book.id,
             user_id=current_user.id,
             rating=rating,
             text=text_raw,
+            text_html=text_html,
+            text_render_version=render_version,
             status_id=pending_id,
         )
         db.session.add(review)
+        on_review_created(review)
         db.session.commit()
+        counters.incr(reviews_by_status(pending_id), 1)
+        counters.incr(reviews_by_user(current_user.id), 1)
         flash("Рецензия отправлена на модерацию.", "success")
         return redirect(url_for("books.book_view", book_id=book.id))
     except Exception:
@@ -96,13 +204,12 @@ def review_create(book_id: int):
 
 @reviews_bp.get("/my/reviews")
 @any_authenticated()
+@reads_from_replica
 def my_reviews():
     page = parse_page_arg(request.args.get("page"), 1)
     page_size = current_app.config.get("PAGE_SIZE", 10)
 
-    total = db.session.scalar(
-        select(func.count(Review.id)).where(Review.user_id == current_user.id)
-    ) or 0
+    total = review_total_by_user(current_user.id)
 
     stmt = (
         select(Review)
@@ -117,34 +224,145 @@ def my_reviews():
     return render_template("my_reviews.html", items=items, page=page, page_size=page_size, total=total)
 
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _lease_is_free(now: datetime):
+    return or_(Review.claim_expires_at.is_(None), Review.claim_expires_at <= now)
+
+
+def _lease_allows_current_user(now: datetime):
+    return or_(_lease_is_free(now), Review.claimed_by_id == current_user.id)
+
+
+def _held_by_other_moderator(r: Review, now: datetime) -> bool:
+    return (
+        r.claimed_by_id is not None
+        and r.claimed_by_id != current_user.id
+        and r.claim_expires_at is not None
+        and r.claim_expires_at > now
+    )
+
+
+def _lease_conflict():
+    db.session.rollback()
+    flash("Рецензию сейчас рассматривает другой модератор.", "warning")
+    return redirect(url_for("reviews.moderation_queue"))
+
+
 @reviews_bp.get("/moderation/reviews")
 @roles_required("Moderator", "Admin")
+@reads_from_replica
 def moderation_queue():
     page = parse_page_arg(request.args.get("page"), 1)
     page_size = current_app.config.get("PAGE_SIZE", 10)
+    mine = request.args.get("mine") == "1"
+    now = _utcnow()
 
-    pending_id = db.session.scalar(
-        select(ReviewStatus.id).where(ReviewStatus.name == "На рассмотрении")
-    )
+    pending_id = refdata.status_id(ReviewStatus.PENDING)
     if not pending_id:
         flash("Статусы рецензий не инициализированы.", "danger")
         return redirect(url_for("books.index"))
 
-    total = db.session.scalar(
-        select(func.count(Review.id)).where(Review.status_id == pending_id)
-    ) or 0
-
     stmt = (
         select(Review)
-        .options(joinedload(Review.book), joinedload(Review.user))
+        .options(joinedload(Review.book), joinedload(Review.user), joinedload(Review.claimed_by))
         .where(Review.status_id == pending_id)
-        .order_by(desc(Review.created_at))
-        .limit(page_size)
-        .offset((page - 1) * page_size)
     )
-    items = db.session.execute(stmt).unique().scalars().all()
+    if mine:
+        stmt = stmt.where(Review.claimed_by_id == current_user.id, Review.claim_expires_at > now)
+        items = db.session.execute(stmt.order_by(Review.created_at, Review.id)).unique().scalars().all()
+        total = len(items)
+        page, page_size = 1, max(total, 1)
+    else:
+        total = review_total_by_status(pending_id)
+        stmt = stmt.order_by(desc(Review.created_at)).limit(page_size).offset((page - 1) * page_size)
+        items = db.session.execute(stmt).unique().scalars().all()
+
+    return render_template(
+        "moderation_list.html",
+        items=items,
+        page=page,
+        page_size=page_size,
+        total=total,
+        mine=mine,
+        now=now,
+        claim_batch=current_app.config.get("MODERATION_CLAIM_BATCH", 10),
+    )
+
+
+@reviews_bp.post("/moderation/reviews/claim")
+@roles_required("Moderator", "Admin")
+def moderation_claim():
+    batch = current_app.config.get("MODERATION_CLAIM_BATCH", 10)
+    lease = timedelta(seconds=current_app.config.get("MODERATION_LEASE_SECONDS", 900))
+    now = _utcnow()
+
+    pending_id = refdata.status_id(ReviewStatus.PENDING)
+    if not pending_id:
+        flash("Статусы рецензий не инициализированы.", "danger")
+        return redirect(url_for("reviews.moderation_queue"))
 
-    return render_template("moderation_list.html", items=items, page=page, page_size=page_size, total=total)
+    try:
+        held = db.session.scalar(
+            select(func.count(Review.id)).where(
+                Review.status_id == pending_id,
+                Review.claimed_by_id == current_user.id,
+                Review.claim_expires_at > now,
+            )
+        ) or 0
+        wanted = batch - held
+        claimed = 0
+        if wanted > 0:
+            # На MySQL/PostgreSQL SKIP LOCKED разводит параллельных модераторов по разным строкам;
+            # SQLite FOR UPDATE не поддерживает, и от двойного захвата там защищает условие UPDATE ниже.
+            candidate_ids = db.session.scalars(
+                select(Review.id)
+                .where(Review.status_id == pending_id, _lease_is_free(now))
+                .order_by(Review.created_at, Review.id)
+                .limit(wanted)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if candidate_ids:
+                result = db.session.execute(
+                    update(Review)
+                    .where(
+                        Review.id.in_(candidate_ids),
+                        Review.status_id == pending_id,
+                        _lease_is_free(now),
+                    )
+                    .values(claimed_by_id=current_user.id, claim_expires_at=now + lease)
+                    .execution_options(synchronize_session=False)
+                )
+                claimed = result.rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        flash("Не удалось взять рецензии в работу. Повторите попытку.", "danger")
+        return redirect(url_for("reviews.moderation_queue"))
+
+    if claimed:
+        flash(f"Взято в работу рецензий: {claimed}.", "success")
+    elif held:
+        flash("Сначала рассмотрите рецензии, уже взятые в работу.", "info")
+    else:
+        flash("Свободных рецензий на рассмотрении нет.", "info")
+    return redirect(url_for("reviews.moderation_queue", mine=1))
+
+
+@reviews_bp.post("/moderation/reviews/release")
+@roles_required("Moderator", "Admin")
+def moderation_release():
+    db.session.execute(
+        update(Review)
+        .where(Review.claimed_by_id == current_user.id)
+        .values(claimed_by_id=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    flash("Рецензии возвращены в общую очередь.", "info")
+    return redirect(url_for("reviews.moderation_queue"))
 
 
 @reviews_bp.get("/moderation/reviews/<int:review_id>")
@@ -159,27 +377,32 @@ def moderation_review(review_id: int):
         flash("Рецензия не найдена.", "warning")
         return redirect(url_for("reviews.moderation_queue"))
 
-    text_html = markdown_to_html_safe(r.text or "")
+    text_html = stored_markdown_html(r.text, r.text_html, r.text_render_version)
     return render_template("moderation_review.html", r=r, text_html=text_html)
 
 
 @reviews_bp.post("/moderation/reviews/<int:review_id>/approve")
 @roles_required("Moderator", "Admin")
 def moderation_approve(review_id: int):
-    r = db.session.get(Review, review_id)
+    r = db.session.get(Review, review_id, with_for_update=True)
     if not r:
         flash("Рецензия не найдена.", "warning")
         return redirect(url_for("reviews.moderation_queue"))
+    if _held_by_other_moderator(r, _utcnow()):
+        return _lease_conflict()
 
-    approved_id = db.session.scalar(
-        select(ReviewStatus.id).where(ReviewStatus.name == "Одобрена")
-    )
+    approved_id = refdata.status_id(ReviewStatus.APPROVED)
     if not approved_id:
         flash("Статусы рецензий не инициализированы.", "danger")
         return redirect(url_for("reviews.moderation_queue"))
 
+    old_status_id = r.status_id
     r.status_id = approved_id
+    r.claimed_by_id = None
+    r.claim_expires_at = None
+    on_review_status_changed(r, was_approved=old_status_id == approved_id, is_approved=True)
     db.session.commit()
+    review_status_moved(old_status_id, approved_id)
     flash("Рецензия одобрена.", "success")
     return redirect(url_for("reviews.moderation_queue"))
 
@@ -187,19 +410,89 @@ def moderation_approve(review_id: int):
 @reviews_bp.post("/moderation/reviews/<int:review_id>/reject")
 @roles_required("Moderator", "Admin")
 def moderation_reject(review_id: int):
-    r = db.session.get(Review, review_id)
+    r = db.session.get(Review, review_id, with_for_update=True)
     if not r:
         flash("Рецензия не найдена.", "warning")
         return redirect(url_for("reviews.moderation_queue"))
+    if _held_by_other_moderator(r, _utcnow()):
+        return _lease_conflict()
 
-    rejected_id = db.session.scalar(
-        select(ReviewStatus.id).where(ReviewStatus.name == "Отклонена")
-    )
+    rejected_id = refdata.status_id(ReviewStatus.REJECTED)
+    approved_id = refdata.status_id(ReviewStatus.APPROVED)
     if not rejected_id:
         flash("Статусы рецензий не инициализированы.", "danger")
         return redirect(url_for("reviews.moderation_queue"))
 
+    old_status_id = r.status_id
     r.status_id = rejected_id
+    r.claimed_by_id = None
+    r.claim_expires_at = None
+    on_review_status_changed(r, was_approved=old_status_id == approved_id, is_approved=False)
     db.session.commit()
+    review_status_moved(old_status_id, rejected_id)
     flash("Рецензия отклонена.", "warning")
     return redirect(url_for("reviews.moderation_queue"))
+
+
+BULK_MODERATION_LIMIT = 500
+
+
+@reviews_bp.post("/moderation/reviews/bulk")
+@roles_required("Moderator", "Admin")
+def moderation_bulk():
+    action = request.form.get("action")
+    review_ids = sorted({int(v) for v in request.form.getlist("review_ids") if str(v).isdigit()})
+    if action not in ("approve", "reject") or not review_ids:
+        flash("Выберите рецензии и действие.", "warning")
+        return redirect(url_for("reviews.moderation_queue"))
+    if len(review_ids) > BULK_MODERATION_LIMIT:
+        flash(f"За один раз можно обработать не более {BULK_MODERATION_LIMIT} рецензий.", "warning")
+        return redirect(url_for("reviews.moderation_queue"))
+
+    pending_id = refdata.status_id(ReviewStatus.PENDING)
+    new_status_id = refdata.status_id(ReviewStatus.APPROVED if action == "approve" else ReviewStatus.REJECTED)
+    if not pending_id or not new_status_id:
+        flash("Статусы рецензий не инициализированы.", "danger")
+        return redirect(url_for("reviews.moderation_queue"))
+
+    now = _utcnow()
+    try:
+        # Рецензии, взятые в работу другим модератором, пропускаются.
+        rows = db.session.execute(
+            select(Review.id, Review.book_id, Review.rating)
+            .where(Review.id.in_(review_ids), Review.status_id == pending_id, _lease_allows_current_user(now))
+            .order_by(Review.id)
+            .with_for_update()
+        ).all()
+        changed = 0
+        if rows:
+            result = db.session.execute(
+                update(Review)
+                .where(
+                    Review.id.in_([row.id for row in rows]),
+                    Review.status_id == pending_id,
+                    _lease_allows_current_user(now),
+                )
+                .values(status_id=new_status_id, claimed_by_id=None, claim_expires_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            changed = result.rowcount
+            if action == "approve":
+                if changed == len(rows):
+                    on_reviews_approved((row.book_id, row.rating) for row in rows)
+                else:
+                    recalculate_book_stats(row.book_id for row in rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        flash("Не удалось применить действие к выбранным рецензиям.", "danger")
+        return redirect(url_for("reviews.moderation_queue"))
+
+    review_status_moved(pending_id, new_status_id, changed)
+    skipped = len(review_ids) - changed
+    verb = "Одобрено" if action == "approve" else "Отклонено"
+    message = f"{verb} рецензий: {changed}."
+    if skipped:
+        message += f" Пропущено (уже рассмотрены, в работе у другого модератора или не найдены): {skipped}."
+    flash(message, "success" if action == "approve" else "warning")
+    return redirect(url_for("reviews.moderation_queue"))
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import exists, func, select
+from sqlalchemy.dialects.mysql import match
+
+from . import db
+from .catalogue import BookDoc, CatalogueIndex, register_index
+from .models import Book, BookGenre
+from .refdata import refdata
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Вес совпадения в поле: название важнее автора, автор — издательства и описания.
+FIELD_WEIGHTS: Tuple[Tuple[str, float], ...] = (
+    ("title", 3.0),
+    ("author", 2.0),
+    ("publisher", 1.0),
+    ("short_description", 1.0),
+)
+
+MAX_QUERY_TERMS = 8
+MAX_PREFIX_EXPANSIONS = 64
+# До стольких найденных книг ранг считается для каждой; больше — обход групп ранга.
+SCORE_ALL_LIMIT = 2000
+# Сколько наборов id под фильтры (жанры, годы) держать между запросами.
+FILTER_CACHE_SIZE = 32
+
+
+def normalize(text: Optional[str]) -> str:
+    """Регистр и «ё» не различаются: «Ёлка» и «елка» — одно и то же."""
+    return (text or "").casefold().replace("ё", "е")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def _parse_year(raw: Optional[str]) -> Optional[int]:
+    try:
+        year = int(raw)
+    except (TypeError, ValueError):
+        return None
+    return year if 1000 <= year <= 2100 else None
+
+
+@dataclass(frozen=True)
+class BookQuery:
+    """
+    Поиск и фильтры списка книг из query string: ``q``, ``genre`` (можно несколько —
+    книга подходит, если у неё есть хотя бы один), ``year_from``, ``year_to``.
+    """
+
+    q: str = ""
+    genre_ids: Tuple[int, ...] = ()
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, args) -> "BookQuery":
+        year_from = _parse_year(args.get("year_from"))
+        year_to = _parse_year(args.get("year_to"))
+        if year_from and year_to and year_from > year_to:
+            year_from, year_to = year_to, year_from
+        return cls(
+            q=" ".join((args.get("q") or "").split())[:200],
+            genre_ids=tuple(refdata.valid_genre_ids(args.getlist("genre"))),
+            year_from=year_from,
+            year_to=year_to,
+        )
+
+    @property
+    def terms(self) -> List[str]:
+        return tokenize(self.q)[:MAX_QUERY_TERMS]
+
+    @property
+    def is_search(self) -> bool:
+        return bool(self.terms)
+
+    @property
+    def is_filtered(self) -> bool:
+        return bool(self.genre_ids) or self.year_from is not None or self.year_to is not None
+
+    def url_args(self, **overrides) -> Dict[str, object]:
+        """Аргументы для url_for, сохраняющие текущий поиск и фильтры."""
+        args: Dict[str, object] = {}
+        if self.q:
+            args["q"] = self.q
+        if self.genre_ids:
+            args["genre"] = list(self.genre_ids)
+        if self.year_from is not None:
+            args["year_from"] = self.year_from
+        if self.year_to is not None:
+            args["year_to"] = self.year_to
+        args.update(overrides)
+        return {k: v for k, v in args.items() if v not in (None, "", [], ())}
+
+    def matches(self, year: int, genre_ids: FrozenSet[int]) -> bool:
+        if self.year_from is not None and year < self.year_from:
+            return False
+        if self.year_to is not None and year > self.year_to:
+            return False
+        if self.genre_ids and not genre_ids.intersection(self.genre_ids):
+            return False
+        return True
+
+    def where_clauses(self) -> list:
+        clauses = []
+        if self.year_from is not None:
+            clauses.append(Book.year >= self.year_from)
+        if self.year_to is not None:
+            clauses.append(Book.year <= self.year_to)
+        if self.genre_ids:
+            clauses.append(
+                exists().where(BookGenre.book_id == Book.id, BookGenre.genre_id.in_(self.genre_ids))
+            )
+        return clauses
+
+
+class InvertedIndex(CatalogueIndex):
+    """
+    Полнотекстовый индекс каталога в памяти — для SQLite (тесты, разработка).
+
+    Постинги: терм → {id книги: сумма весов полей, где он встречается}; те же id
+    разложены по весам (``_tiers``), а для фильтров — по жанрам и годам. Подходящие
+    книги находятся операциями над множествами; ранг — сумма idf·вес по словам
+    запроса (последнее слово — как префикс), при равенстве выше новые (больший id).
+    """
+
+    def __init__(self, check_interval: float = 30.0) -> None:
+        super().__init__(check_interval)
+        self._reset()
+
+    def enabled(self) -> bool:
+        return search_backend() == "memory"
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._tiers: Dict[str, Dict[float, List[int]]] = {}
+        self._doc_terms: Dict[int, Tuple[Tuple[str, float], ...]] = {}
+        self._years: Dict[int, int] = {}
+        self._genres: Dict[int, FrozenSet[int]] = {}
+        self._by_year: Dict[int, Set[int]] = defaultdict(set)
+        self._by_genre: Dict[int, Set[int]] = defaultdict(set)
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self._filter_cache: Dict[Tuple, Set[int]] = {}
+
+    def _add(self, doc: BookDoc) -> None:
+        self._filter_cache.clear()
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS:
+            for term in set(tokenize(getattr(doc, field))):
+                weights[term] += weight
+        for term, weight in weights.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                self._tiers[term] = {}
+                self._vocab_dirty = True
+            posting[doc.id] = weight
+            tier = self._tiers[term].setdefault(weight, [])
+            if not tier or tier[-1] < doc.id:
+                tier.append(doc.id)
+            else:
+                bisect.insort(tier, doc.id)
+        self._doc_terms[doc.id] = tuple(weights.items())
+        self._years[doc.id] = doc.year
+        self._genres[doc.id] = doc.genre_ids
+        self._by_year[doc.year].add(doc.id)
+        for genre_id in doc.genre_ids:
+            self._by_genre[genre_id].add(doc.id)
+
+    def _remove(self, book_id: int) -> None:
+        self._filter_cache.clear()
+        for term, weight in self._doc_terms.pop(book_id, ()):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(book_id, None)
+            tier = self._tiers[term].get(weight)
+            if tier is not None:
+                i = bisect.bisect_left(tier, book_id)
+                if i < len(tier) and tier[i] == book_id:
+                    del tier[i]
+                if not tier:
+                    del self._tiers[term][weight]
+            if not posting:
+                del self._postings[term]
+                del self._tiers[term]
+                self._vocab_dirty = True
+        year = self._years.pop(book_id, None)
+        if year is not None:
+            self._by_year[year].discard(book_id)
+        for genre_id in self._genres.pop(book_id, ()):
+            self._by_genre[genre_id].discard(book_id)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        start = bisect.bisect_left(self._vocab, prefix)
+        found = []
+        for term in self._vocab[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            found.append(term)
+        return found
+
+    def _term_sources(self, terms: List[str]) -> List[Tuple[str, float]]:
+        total_docs = max(len(self._doc_terms), 1)
+        return [
+            (term, math.log(1.0 + total_docs / len(self._postings[term])))
+            for term in terms
+            if term in self._postings
+        ]
+
+    def _filter_ids(self, query: BookQuery) -> Optional[Set[int]]:
+        if not query.is_filtered:
+            return None
+        key = (query.genre_ids, query.year_from, query.year_to)
+        allowed = self._filter_cache.get(key)
+        if allowed is None:
+            allowed = self._build_filter(query)
+            if len(self._filter_cache) >= FILTER_CACHE_SIZE:
+                self._filter_cache.pop(next(iter(self._filter_cache)))
+            self._filter_cache[key] = allowed
+        return allowed
+
+    def _build_filter(self, query: BookQuery) -> Set[int]:
+        allowed: Optional[Set[int]] = None
+        if query.genre_ids:
+            allowed = set().union(*(self._by_genre.get(g, ()) for g in query.genre_ids))
+        if query.year_from is not None or query.year_to is not None:
+            lo = query.year_from if query.year_from is not None else 0
+            hi = query.year_to if query.year_to is not None else 9999
+            by_years = set().union(*(ids for year, ids in self._by_year.items() if lo <= year <= hi))
+            allowed = by_years if allowed is None else allowed & by_years
+        return allowed if allowed is not None else set()
+
+    def _group_scores(self, sources: List[Tuple[str, float]], candidates: Set[int]) -> Dict[int, float]:
+        """Вклад одного слова запроса в ранг каждой книги из candidates."""
+        scores: Dict[int, float] = {}
+        for term, idf in sources:
+            posting = self._postings[term]
+            if len(posting) <= len(candidates):
+                pairs = [(i, w) for i, w in posting.items() if i in candidates]
+            else:
+                pairs = [(i, posting[i]) for i in candidates if i in posting]
+            for book_id, weight in pairs:
+                score = weight * idf
+                if score > scores.get(book_id, 0.0):
+                    scores[book_id] = score
+        return scores
+
+    def _top_single(self, sources: List[Tuple[str, float]], allowed: Optional[Set[int]], need: int) -> List[int]:
+        # Ранг однословного запроса принимает лишь несколько значений (idf·вес),
+        # а id в каждой группе уже отсортированы: идём от старшего ранга и старших
+        # id и останавливаемся, как только набрали страницу.
+        groups: Dict[float, List[List[int]]] = defaultdict(list)
+        for term, idf in sources:
+            for weight, ids in self._tiers[term].items():
+                groups[idf * weight].append(ids)
+
+        top: List[int] = []
+        seen: Set[int] = set()
+        for score in sorted(groups, reverse=True):
+            lists = groups[score]
+            if len(lists) == 1:
+                ordered = reversed(lists[0])
+            else:
+                ordered = heapq.merge(*(reversed(ids) for ids in lists), reverse=True)
+            for book_id in ordered:
+                if book_id in seen:
+                    continue
+                seen.add(book_id)
+                if allowed is not None and book_id not in allowed:
+                    continue
+                top.append(book_id)
+                if len(top) >= need:
+                    return top
+        return top
+
+    def search(self, query: BookQuery, offset: int, limit: int) -> Tuple[List[int], int]:
+        self._ensure_fresh()
+        terms = query.terms
+        need = offset + limit
+        with self._lock:
+            per_term = [self._term_sources([t]) for t in terms[:-1]]
+            per_term.append(self._term_sources(self._prefix_terms(terms[-1])))
+            if not all(per_term):
+                return [], 0
+
+            # Начинаем с самого редкого слова и отсеиваем его книги остальными словами.
+            per_term.sort(key=lambda sources: sum(len(self._postings[t]) for t, _idf in sources))
+            first = [self._postings[t] for t, _idf in per_term[0]]
+            allowed = self._filter_ids(query)
+
+            candidates: Optional[Set[int]] = None
+            if len(per_term) == 1 and len(first) == 1 and allowed is None:
+                total = len(first[0])
+            else:
+                if len(first) > 1:
+                    candidates = set().union(*first)
+                    if allowed is not None:
+                        candidates &= allowed
+                elif allowed is not None:
+                    candidates = first[0].keys() & allowed
+                else:
+                    candidates = set(first[0])
+                for sources in per_term[1:]:
+                    postings = [self._postings[t] for t, _idf in sources]
+                    if len(postings) == 1:
+                        candidates = postings[0].keys() & candidates
+                    else:
+                        candidates = {i for i in candidates if any(i in p for p in postings)}
+                total = len(candidates)
+
+            if len(per_term) == 1 and (candidates is None or len(candidates) > SCORE_ALL_LIMIT):
+                top = self._top_single(per_term[0], allowed, need)
+            else:
+                totals: Dict[int, float] = dict.fromkeys(candidates, 0.0)
+                for sources in per_term:
+                    for book_id, score in self._group_scores(sources, candidates).items():
+                        totals[book_id] += score
+                top = [book_id for _score, book_id in heapq.nlargest(need, ((v, k) for k, v in totals.items()))]
+
+        return top[offset:need], total
+
+
+search_index = register_index(InvertedIndex())
+
+
+def search_backend() -> str:
+    backend = current_app.config.get("SEARCH_BACKEND", "auto")
+    if backend == "auto":
+        return "mysql" if db.engine.dialect.name == "mysql" else "memory"
+    return backend
+
+
+def _mysql_search(query: BookQuery, offset: int, limit: int) -> Tuple[List[int], int]:
+    terms = query.terms
+    against = " ".join([f"+{t}" for t in terms[:-1]] + [f"+{terms[-1]}*"])
+    relevance = match(
+        Book.title, Book.author, Book.publisher, Book.short_description, against=against
+    ).in_boolean_mode()
+
+    stmt = select(Book.id).where(relevance, *query.where_clauses())
+    total = db.session.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+    ids = db.session.scalars(
+        stmt.order_by(relevance.desc(), Book.id.desc()).offset(offset).limit(limit)
+    ).all()
+    return list(ids), total
+
+
+def search_books(query: BookQuery, offset: int, limit: int) -> Tuple[List[int], int]:
+    """
+    id книг, подходящих под поиск и фильтры, по убыванию релевантности, и их общее число.
+    """
+    if not query.is_search:
+        return [], 0
+    if search_backend() == "mysql":
+        return _mysql_search(query, offset, limit)
+    return search_index.search(query, offset, limit)
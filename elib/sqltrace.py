@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import heapq
+import json
+import re
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Форма запроса без значений: списки плейсхолдеров IN (?, ?, ?) сворачиваются
+    в (?), числа — в ?. Одинаковая форма много раз за запрос — признак N+1.
+    """
+    shape = _SPACES_RE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST_RE.sub("(?)", shape)
+    return _NUMBER_RE.sub("?", shape)
+
+
+class RequestTrace:
+    __slots__ = ("count", "total", "statements")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.statements: List[Tuple[float, str]] = []
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.statements.append((duration, statement))
+
+    def slowest(self, n: int) -> List[Tuple[float, str]]:
+        return heapq.nlargest(n, self.statements, key=lambda item: item[0])
+
+    def repeated_shapes(self, threshold: int) -> List[Tuple[str, int]]:
+        counts = Counter(statement_shape(statement) for _duration, statement in self.statements)
+        return [(shape, n) for shape, n in counts.most_common() if n >= threshold]
+
+
+class SqlTracer:
+    """
+    Учёт SQL по HTTP-запросам: число запросов, суммарное время в БД, самые медленные
+    запросы и повторяющиеся формы (N+1). Итог — заголовок ``Server-Timing`` и одна
+    строка лога в JSON.
+
+    Включается ``SQL_TRACE_ENABLED``; выключенный не вешает ни одного обработчика
+    событий, так что ничего не стоит.
+    """
+
+    _listening = False
+
+    def __init__(self) -> None:
+        self.slowest = 3
+        self.n_plus_one_threshold = 5
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config.get("SQL_TRACE_ENABLED", False):
+            return
+        self.slowest = int(app.config.get("SQL_TRACE_SLOWEST", self.slowest))
+        self.n_plus_one_threshold = int(app.config.get("SQL_TRACE_N_PLUS_ONE", self.n_plus_one_threshold))
+        self._listen()
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    @classmethod
+    def _listen(cls) -> None:
+        # Слушаем класс Engine: попадают и основная БД, и реплики, созданные позже.
+        if cls._listening:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        cls._listening = True
+
+    @staticmethod
+    def _start() -> None:
+        g.sql_trace = RequestTrace()
+
+    def _finish(self, response: Response) -> Response:
+        trace: Optional[RequestTrace] = g.pop("sql_trace", None)
+        if trace is None:
+            return response
+
+        total_ms = trace.total * 1000
+        timing = [f'db;dur={total_ms:.1f};desc="{trace.count} queries"']
+        repeated = trace.repeated_shapes(self.n_plus_one_threshold)
+        if repeated:
+            timing.append(f'db-repeated;desc="{repeated[0][1]}x same statement"')
+        response.headers.add("Server-Timing", ", ".join(timing))
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "queries": trace.count,
+            "db_ms": round(total_ms, 2),
+            "slowest": [
+                {"ms": round(duration * 1000, 2), "sql": _SPACES_RE.sub(" ", statement)[:300]}
+                for duration, statement in trace.slowest(self.slowest)
+            ],
+            "n_plus_one": [{"count": n, "sql": shape[:300]} for shape, n in repeated],
+        }
+        log = current_app.logger.warning if repeated else current_app.logger.info
+        log("sql %s", json.dumps(record, ensure_ascii=False))
+        return response
+
+
+def _current_trace() -> Optional[RequestTrace]:
+    if not has_app_context():
+        return None
+    return g.get("sql_trace")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    # Время старта — на контексте выполнения: он свой у каждого выражения и исчезает
+    # вместе с ним, даже если выражение упало и after_cursor_execute не вызывался.
+    if context is not None and _current_trace() is not None:
+        context._elib_t0 = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    trace = _current_trace()
+    started = getattr(context, "_elib_t0", None)
+    if trace is None or started is None:
+        return
+    trace.record(statement, time.perf_counter() - started)
+
+
+sql_tracer = SqlTracer()
@@ -18,3 +18,81 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   });
 });
+
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("[data-check-all]").forEach(function (master) {
+    const name = master.getAttribute("data-check-all");
+    const form = master.closest("form");
+    if (!form) return;
+
+    master.addEventListener("change", function () {
+      form.querySelectorAll(`input[type="checkbox"][name="${name}"]`).forEach(function (box) {
+        box.checked = master.checked;
+      });
+    });
+  });
+});
+
+document.addEventListener("click", function (event) {
+  const link = event.target.closest("[data-load-more]");
+  if (!link) return;
+  event.preventDefault();
+
+  const container = link.closest("[data-load-more-container]");
+  link.classList.add("disabled");
+
+  fetch(link.href, { headers: { "X-Requested-With": "fetch" } })
+    .then(function (resp) {
+      if (!resp.ok) throw new Error(resp.statusText);
+      return resp.text();
+    })
+    .then(function (html) {
+      container.insertAdjacentHTML("beforebegin", html);
+      container.remove();
+    })
+    .catch(function () {
+      link.classList.remove("disabled");
+    });
+});
+
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("input[data-suggest-url]").forEach(function (input) {
+    const list = document.getElementById(input.getAttribute("list"));
+    if (!list) return;
+
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      const q = input.value.trim();
+      if (!q) {
+        list.replaceChildren();
+        return;
+      }
+      timer = setTimeout(function () {
+        if (controller) controller.abort();
+        controller = new AbortController();
+        const url = `${input.dataset.suggestUrl}?q=${encodeURIComponent(q)}`;
+        fetch(url, { signal: controller.signal })
+          .then(function (resp) {
+            if (!resp.ok) throw new Error(resp.statusText);
+            return resp.json();
+          })
+          .then(function (data) {
+            list.replaceChildren(...data.items.map(function (item) {
+              const option = document.createElement("option");
+              option.value = item.value;
+              option.label = item.kind === "author" ? "Автор" : "Название";
+              return option;
+            }));
+          })
+          .catch(function () {});
+      }, 120);
+    });
+
+    list.closest("form").addEventListener("submit", function () {
+      clearTimeout(timer);
+    });
+  });
+});
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func, case, update, delete, insert
+
+from . import db
+from .models import Book, BookStats, Review, ReviewStatus
+
+
+StatsRow = Tuple[int, int, int]
+
+
+def _approved_status_id():
+    return select(ReviewStatus.id).where(ReviewStatus.name == ReviewStatus.APPROVED).scalar_subquery()
+
+
+def _aggregate_stmt():
+    is_approved = Review.status_id == _approved_status_id()
+    return (
+        select(
+            Book.id.label("book_id"),
+            func.count(Review.id).label("reviews_count"),
+            func.coalesce(func.sum(case((is_approved, 1), else_=0)), 0).label("approved_count"),
+            func.coalesce(func.sum(case((is_approved, Review.rating), else_=0)), 0).label("approved_rating_sum"),
+        )
+        .select_from(Book)
+        .outerjoin(Review, Review.book_id == Book.id)
+        .group_by(Book.id)
+    )
+
+
+def create_book_stats(book_id: int) -> None:
+    db.session.add(BookStats(book_id=book_id, reviews_count=0, approved_count=0, approved_rating_sum=0))
+
+
+def apply_review_delta(book_id: int, reviews: int = 0, approved: int = 0, rating_sum: int = 0) -> None:
+    """
+    Сдвигаем агрегаты книги в текущей транзакции. Если строки нет — пересчитываем её из reviews.
+    """
+    result = db.session.execute(
+        update(BookStats)
+        .where(BookStats.book_id == book_id)
+        .values(
+            reviews_count=BookStats.reviews_count + reviews,
+            approved_count=BookStats.approved_count + approved,
+            approved_rating_sum=BookStats.approved_rating_sum + rating_sum,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.flush()
+        db.session.execute(
+            insert(BookStats).from_select(
+                ["book_id", "reviews_count", "approved_count", "approved_rating_sum"],
+                _aggregate_stmt().where(Book.id == book_id),
+            )
+        )
+
+
+def on_review_created(review: Review, is_approved: bool = False) -> None:
+    apply_review_delta(
+        review.book_id,
+        reviews=1,
+        approved=1 if is_approved else 0,
+        rating_sum=review.rating if is_approved else 0,
+    )
+
+
+def on_review_status_changed(review: Review, was_approved: bool, is_approved: bool) -> None:
+    if was_approved == is_approved:
+        return
+    sign = 1 if is_approved else -1
+    apply_review_delta(review.book_id, approved=sign, rating_sum=sign * review.rating)
+
+
+def on_reviews_approved(rows: Iterable) -> None:
+    """
+    Пакетный вариант on_review_status_changed для одобрения: строки (book_id, rating).
+    """
+    deltas: Dict[int, List[int]] = {}
+    for book_id, rating in rows:
+        d = deltas.setdefault(book_id, [0, 0])
+        d[0] += 1
+        d[1] += rating
+    for book_id, (count, rating_sum) in sorted(deltas.items()):
+        apply_review_delta(book_id, approved=count, rating_sum=rating_sum)
+
+
+def recalculate_book_stats(book_ids: Iterable[int]) -> None:
+    book_ids = sorted(set(book_ids))
+    if not book_ids:
+        return
+    db.session.execute(delete(BookStats).where(BookStats.book_id.in_(book_ids)))
+    db.session.execute(
+        insert(BookStats).from_select(
+            ["book_id", "reviews_count", "approved_count", "approved_rating_sum"],
+            _aggregate_stmt().where(Book.id.in_(book_ids)),
+        )
+    )
+
+
+def rebuild_book_stats() -> int:
+    db.session.execute(delete(BookStats))
+    db.session.execute(
+        insert(BookStats).from_select(
+            ["book_id", "reviews_count", "approved_count", "approved_rating_sum"],
+            _aggregate_stmt(),
+        )
+    )
+    db.session.commit()
+    return db.session.scalar(select(func.count()).select_from(BookStats)) or 0
+
+
+def verify_book_stats() -> List[Tuple[int, Optional[StatsRow], Optional[StatsRow]]]:
+    """
+    Возвращает расхождения: (book_id, ожидаемые значения, сохранённые значения).
+    """
+    stored: Dict[int, StatsRow] = {
+        row.book_id: (row.reviews_count, row.approved_count, row.approved_rating_sum)
+        for row in db.session.execute(
+            select(
+                BookStats.book_id,
+                BookStats.reviews_count,
+                BookStats.approved_count,
+                BookStats.approved_rating_sum,
+            )
+        )
+    }
+    mismatches = []
+    for row in db.session.execute(_aggregate_stmt()):
+        expected = (int(row.reviews_count), int(row.approved_count), int(row.approved_rating_sum))
+        actual = stored.pop(row.book_id, None)
+        if actual != expected:
+            mismatches.append((row.book_id, expected, actual))
+    for book_id, actual in stored.items():
+        mismatches.append((book_id, None, actual))
+    return mismatches
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from .catalogue import BookDoc, CatalogueIndex, register_index
+from .search import normalize
+
+TITLE = "title"
+AUTHOR = "author"
+
+# Ключ — нормализованный хвост строки от начала слова, обрезанный до KEY_LENGTH:
+# длиннее подсказки почти не набирают, а индекс остаётся компактным.
+KEY_LENGTH = 24
+MAX_SUGGESTIONS = 20
+# Сколько ключей с подходящим префиксом просматривать в поисках top-N.
+MAX_SCAN = 1000
+
+_WORD_START_RE = re.compile(r"(?<!\w)\w")
+_SPACES_RE = re.compile(r"\s+")
+
+_LATIN = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+_CYRILLIC = "йцукенгшщзхъфывапролджэячсмитьбюё"
+_LAYOUT = str.maketrans(_LATIN, _CYRILLIC)
+
+Value = Tuple[str, str]
+
+
+def normalize_prefix(text: str) -> str:
+    return _SPACES_RE.sub(" ", normalize(text)).strip()
+
+
+def switch_layout(text: str) -> str:
+    """Набранное в английской раскладке вместо русской: «ujujkm» → «гоголь»."""
+    return text.translate(_LAYOUT)
+
+
+def _keys(display: str) -> List[Tuple[str, bool]]:
+    """(ключ, начинается ли он с начала строки) для каждого слова строки."""
+    norm = normalize_prefix(display)
+    keys = {}
+    for m in _WORD_START_RE.finditer(norm):
+        key = norm[m.start():m.start() + KEY_LENGTH]
+        keys[key] = keys.get(key, False) or m.start() == 0
+    return sorted(keys.items())
+
+
+class PrefixIndex(CatalogueIndex):
+    """
+    Подсказки по названиям и авторам: отсортированный массив ключей (хвосты строк
+    от начала каждого слова) и параллельные массивы ссылок на значения и признака
+    «ключ с начала строки». Поиск — bisect и короткий просмотр вперёд, без БД.
+
+    Одинаковые значения (один автор у многих книг) хранятся один раз со счётчиком
+    книг; чем больше книг, тем выше подсказка.
+    """
+
+    def __init__(self, check_interval: float = 30.0) -> None:
+        super().__init__(check_interval)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._keys: List[str] = []
+        self._refs: List[int] = []
+        self._heads = bytearray()
+        self._values: List[Value] = []
+        self._counts: List[int] = []
+        self._value_ids: Dict[Value, int] = {}
+        self._free: List[int] = []
+        self._docs: Dict[int, Tuple[int, ...]] = {}
+        self._bulk = False
+
+    def _load(self, docs: Iterable[BookDoc]) -> None:
+        # При полной загрузке ключи дописываются в конец и сортируются один раз.
+        self._reset()
+        self._bulk = True
+        try:
+            for doc in docs:
+                self._add(doc)
+        finally:
+            self._bulk = False
+        order = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+        self._keys = [self._keys[i] for i in order]
+        self._refs = [self._refs[i] for i in order]
+        self._heads = bytearray(self._heads[i] for i in order)
+
+    def _insert_value(self, value: Value) -> int:
+        if self._free:
+            ref = self._free.pop()
+            self._values[ref] = value
+            self._counts[ref] = 0
+        else:
+            ref = len(self._values)
+            self._values.append(value)
+            self._counts.append(0)
+        self._value_ids[value] = ref
+        for key, head in _keys(value[1]):
+            pos = len(self._keys) if self._bulk else bisect.bisect_right(self._keys, key)
+            self._keys.insert(pos, key)
+            self._refs.insert(pos, ref)
+            self._heads.insert(pos, head)
+        return ref
+
+    def _drop_value(self, ref: int) -> None:
+        value = self._values[ref]
+        for key, _head in _keys(value[1]):
+            pos = bisect.bisect_left(self._keys, key)
+            while pos < len(self._keys) and self._keys[pos] == key:
+                if self._refs[pos] == ref:
+                    del self._keys[pos]
+                    del self._refs[pos]
+                    del self._heads[pos]
+                    break
+                pos += 1
+        del self._value_ids[value]
+        self._free.append(ref)
+
+    def _add(self, doc: BookDoc) -> None:
+        values = tuple(
+            (kind, display)
+            for kind, display in ((TITLE, doc.title.strip()), (AUTHOR, doc.author.strip()))
+            if display
+        )
+        refs = []
+        for value in values:
+            ref = self._value_ids.get(value)
+            if ref is None:
+                ref = self._insert_value(value)
+            self._counts[ref] += 1
+            refs.append(ref)
+        self._docs[doc.id] = tuple(refs)
+
+    def _remove(self, book_id: int) -> None:
+        for ref in self._docs.pop(book_id, ()):
+            self._counts[ref] -= 1
+            if self._counts[ref] <= 0:
+                self._drop_value(ref)
+
+    def _scan(self, prefix: str, limit: int) -> List[Tuple[Value, int]]:
+        key = prefix[:KEY_LENGTH]
+        lo = bisect.bisect_left(self._keys, key)
+        hi = min(bisect.bisect_left(self._keys, key + "\U0010ffff", lo), lo + MAX_SCAN)
+        found: Dict[int, int] = {}
+        for ref, head in zip(self._refs[lo:hi], self._heads[lo:hi]):
+            found[ref] = found.get(ref, 0) | head
+
+        if len(prefix) > KEY_LENGTH:
+            # Ключи обрезаны — длинный префикс досверяем по самой строке.
+            found = {ref: head for ref, head in found.items() if prefix in normalize_prefix(self._values[ref][1])}
+
+        counts, values = self._counts, self._values
+        best = heapq.nsmallest(
+            limit,
+            found.items(),
+            key=lambda item: (not item[1], -counts[item[0]], values[item[0]][1]),
+        )
+        return [(values[ref], counts[ref]) for ref, _head in best]
+
+    def suggest(self, text: str, limit: int = 10) -> List[Tuple[Value, int]]:
+        """
+        До ``limit`` пар ((вид, строка), число книг): сначала строки, начинающиеся
+        с введённого, затем совпадения с начала слова внутри строки. Если ничего
+        не нашлось, пробуем тот же ввод в русской раскладке.
+        """
+        prefix = normalize_prefix(text)
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        self._ensure_fresh()
+        with self._lock:
+            found = self._scan(prefix, limit)
+            if not found:
+                switched = normalize_prefix(switch_layout(prefix))
+                if switched != prefix:
+                    found = self._scan(switched, limit)
+        return found
+
+
+suggest_index = register_index(PrefixIndex())
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+import posixpath
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+# Повышается при изменении набора размеров, форматов или качества —
+# тогда `flask covers variants` перегенерирует всё.
+VARIANTS_VERSION = 1
+
+VARIANT_SIZES: Tuple[Tuple[int, int], ...] = ((48, 64), (96, 128), (240, 320), (480, 640))
+VARIANT_FORMATS: Tuple[str, ...] = ("webp", "jpg")
+
+_PIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+_QUALITY = 82
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def variant_filename(cover_filename: str, cover_id: int, width: int, height: int, fmt: str) -> str:
+    """
+    Путь варианта относительно COVERS_DIR: рядом с оригиналом, `<cover_id>_<w>x<h>.<fmt>`.
+    """
+    return posixpath.join(posixpath.dirname(cover_filename), f"{cover_id}_{width}x{height}.{fmt}")
+
+
+def variant_filenames(cover_filename: str, cover_id: int) -> List[str]:
+    return [
+        variant_filename(cover_filename, cover_id, w, h, fmt)
+        for w, h in VARIANT_SIZES
+        for fmt in VARIANT_FORMATS
+    ]
+
+
+def render_variant(src_path: str, dst_path: str, width: int, height: int, fmt: str) -> str:
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        thumb = ImageOps.fit(img, (width, height), method=Image.LANCZOS)
+
+    tmp_path = f"{dst_path}.tmp{os.getpid()}"
+    thumb.save(tmp_path, _PIL_FORMATS[fmt], quality=_QUALITY, optimize=True)
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=current_app.config.get("COVER_VARIANT_WORKERS", 2))
+        return _pool
+
+
+def submit_cover_variants(pool: Executor, cover_id: int, cover_filename: str, src_path: Path) -> List[Future]:
+    covers_dir = Path(current_app.config["COVERS_DIR"])
+    return [
+        pool.submit(
+            render_variant,
+            str(src_path),
+            str(covers_dir / variant_filename(cover_filename, cover_id, w, h, fmt)),
+            w,
+            h,
+            fmt,
+        )
+        for w, h in VARIANT_SIZES
+        for fmt in VARIANT_FORMATS
+    ]
+
+
+def wait_cover_variants(cover_id: int, futures: List[Future]) -> Optional[int]:
+    """
+    VARIANTS_VERSION, если все варианты готовы, иначе None (изображение не удалось обработать).
+    """
+    try:
+        for future in futures:
+            future.result()
+    except Exception:
+        current_app.logger.warning("Cover %s: variant generation failed", cover_id, exc_info=True)
+        return None
+    return VARIANTS_VERSION
+
+
+def start_cover_variants(cover_id: int, cover_filename: str, src_path: Path) -> List[Future]:
+    """
+    Ставит все варианты обложки в общий пул процессов и сразу возвращает их future.
+    """
+    return submit_cover_variants(_get_pool(), cover_id, cover_filename, src_path)
+
+
+def variants_up_to_date(cover_filename: str, cover_id: int, src_path: Path) -> bool:
+    covers_dir = Path(current_app.config["COVERS_DIR"])
+    try:
+        src_mtime = src_path.stat().st_mtime
+        return all(
+            (covers_dir / name).stat().st_mtime >= src_mtime
+            for name in variant_filenames(cover_filename, cover_id)
+        )
+    except OSError:
+        return False
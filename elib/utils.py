@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import abc
+import base64
+import binascii
 import hashlib
+import json
 import mimetypes
-import os
 import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import BinaryIO, Optional, Tuple
 
 from flask import current_app
 import nh3
@@ -18,12 +24,6 @@ def ensure_covers_dir() -> Path:
     return covers_dir
 
 
-def calc_md5(data: bytes) -> str:
-    h = hashlib.md5()
-    h.update(data)
-    return h.hexdigest()
-
-
 def _ext_from_mime(mime_type: str) -> Optional[str]:
     if not mime_type:
         return None
@@ -38,37 +38,137 @@ def _ext_from_mime(mime_type: str) -> Optional[str]:
     return mimetypes.guess_extension(mime_type)
 
 
-def _ext_from_filename(filename: str) -> Optional[str]:
-    if not filename:
-        return None
-    ext = os.path.splitext(filename)[1]
-    return ext if ext else None
+class CoverStorage(abc.ABC):
+    """
+    Раскладка файлов обложек внутри COVERS_DIR.
 
+    ``Cover.filename`` хранит путь относительно COVERS_DIR, поэтому файлы любой
+    раскладки читаются одинаково; стратегия определяет лишь, куда кладутся новые.
+    """
 
-def save_cover_file(cover_id: int, file_bytes: bytes, mime_type: Optional[str], original_filename: Optional[str]) -> Tuple[str, Path]:
-    covers_dir = ensure_covers_dir()
-    ext = _ext_from_mime(mime_type or "") or _ext_from_filename(original_filename or "") or ".bin"
-    filename = f"{cover_id}{ext}"
-    full_path = covers_dir / filename
+    name = ""
 
-    with tempfile.NamedTemporaryFile("wb", delete=False, dir=str(covers_dir)) as tmp:
-        tmp.write(file_bytes)
-        tmp_path = Path(tmp.name)
-    tmp_path.replace(full_path)
-    return filename, full_path
+    def __init__(self, root: Path) -> None:
+        self.root = root
 
+    @abc.abstractmethod
+    def relative_path(self, cover_id: int, ext: str) -> str:
+        """Путь нового файла обложки относительно COVERS_DIR."""
 
-def remove_cover_file(filename: str) -> bool:
-    if not filename:
-        return False
-    path = ensure_covers_dir() / filename
-    if path.exists():
+    def path(self, filename: str) -> Path:
+        return self.root / filename
+
+    def place(self, tmp_path: Path, cover_id: int, ext: str) -> Tuple[str, Path]:
+        filename = self.relative_path(cover_id, ext)
+        full_path = self.path(filename)
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.replace(full_path)
+        return filename, full_path
+
+    def remove(self, filename: str) -> bool:
         try:
-            path.unlink()
+            self.path(filename).unlink()
             return True
         except OSError:
             return False
-    return False
+
+
+class FlatCoverStorage(CoverStorage):
+    """`<cover_id><ext>` прямо в COVERS_DIR — исходная раскладка."""
+
+    name = "flat"
+
+    def relative_path(self, cover_id: int, ext: str) -> str:
+        return f"{cover_id}{ext}"
+
+
+class ShardedCoverStorage(CoverStorage):
+    """`ab/cd/<cover_id><ext>`, где ab/cd — начало MD5 от id: не больше 256 записей на уровень."""
+
+    name = "sharded"
+
+    def relative_path(self, cover_id: int, ext: str) -> str:
+        digest = hashlib.md5(str(cover_id).encode("ascii")).hexdigest()
+        return f"{digest[:2]}/{digest[2:4]}/{cover_id}{ext}"
+
+
+COVER_STORAGES = {cls.name: cls for cls in (FlatCoverStorage, ShardedCoverStorage)}
+
+
+def cover_storage(name: Optional[str] = None) -> CoverStorage:
+    name = name or current_app.config.get("COVER_STORAGE", "sharded")
+    try:
+        storage_cls = COVER_STORAGES[name]
+    except KeyError:
+        raise ValueError(f"Unknown cover storage: {name!r}") from None
+    return storage_cls(ensure_covers_dir())
+
+
+COVER_CHUNK_SIZE = 64 * 1024
+
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+
+def sniff_image_mime(head: bytes) -> Optional[str]:
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class IngestedCover:
+    tmp_path: Path
+    md5: str
+    mime_type: Optional[str]
+    size: int
+
+
+def ingest_cover_upload(stream: BinaryIO, chunk_size: int = COVER_CHUNK_SIZE) -> IngestedCover:
+    """
+    Потоково пишем загрузку во временный файл в COVERS_DIR, считая MD5 по ходу:
+    в памяти одновременно не больше одного чанка.
+    """
+    covers_dir = ensure_covers_dir()
+    h = hashlib.md5()
+    head = b""
+    size = 0
+    with tempfile.NamedTemporaryFile("wb", delete=False, dir=str(covers_dir), prefix=".upload-", suffix=".part") as tmp:
+        tmp_path = Path(tmp.name)
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if len(head) < 12:
+                    head += chunk[: 12 - len(head)]
+                h.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            tmp.close()
+            discard_upload(tmp_path)
+            raise
+    return IngestedCover(tmp_path=tmp_path, md5=h.hexdigest(), mime_type=sniff_image_mime(head), size=size)
+
+
+def discard_upload(tmp_path: Path) -> None:
+    try:
+        tmp_path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def commit_cover_file(cover_id: int, tmp_path: Path, mime_type: str) -> Tuple[str, Path]:
+    """
+    Атомарно переименовываем принятую загрузку на её место в хранилище.
+    """
+    return cover_storage().place(tmp_path, cover_id, _ext_from_mime(mime_type) or ".bin")
 
 
 _DEFAULT_ALLOWED_TAGS = {
@@ -91,17 +191,129 @@ _DEFAULT_ALLOWED_ATTRS = {
 _DEFAULT_ALLOWED_PROTOCOLS = {"http", "https", "mailto"}
 
 
-def markdown_to_html_safe(src_text: str) -> str:
-    if not src_text:
-        return ""
+class MarkdownCache:
+    """
+    Ограниченный LRU отрендеренного HTML: ключ — (хэш текста, версия рендера).
+    """
+
+    def __init__(self, maxsize: int = 2048) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Tuple[bytes, str], str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app) -> None:
+        self.maxsize = int(app.config.get("MARKDOWN_CACHE_SIZE", self.maxsize))
+        self.clear()
+
+    def get(self, key: Tuple[bytes, str]) -> Optional[str]:
+        with self._lock:
+            html = self._items.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key: Tuple[bytes, str], html: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+markdown_cache = MarkdownCache()
+
+_thread_state = threading.local()
+
+
+def _markdown_engine(extensions: list) -> md.Markdown:
+    """
+    Markdown-конвейер текущего потока, сброшенный перед очередным документом.
+    """
+    engines = getattr(_thread_state, "engines", None)
+    if engines is None:
+        engines = _thread_state.engines = {}
+    key = tuple(extensions)
+    engine = engines.get(key)
+    if engine is None:
+        engine = engines[key] = md.Markdown(extensions=list(extensions))
+    engine.reset()
+    # Markdown < 3.7: расширение abbr регистрирует шаблон на каждое определение
+    # и не снимает его в reset(), так что сокращения «протекали» бы между документами.
+    for name in [n for n in engine.inlinePatterns._data if n.startswith("abbr-")]:
+        engine.inlinePatterns.deregister(name)
+    return engine
+
+
+def _render_profile() -> Tuple[list, set, dict, str]:
+    cfg = current_app.config
+    sources = (cfg.get("MARKDOWN_EXTENSIONS"), cfg.get("NH3_ALLOWED_TAGS"), cfg.get("NH3_ALLOWED_ATTRS"))
+    cached = current_app.extensions.get("markdown_render_profile")
+    if cached and all(a is b for a, b in zip(cached[0], sources)):
+        return cached[1]
+
+    extensions = list(cfg.get("MARKDOWN_EXTENSIONS", ["extra", "sane_lists", "nl2br"]))
+    tags = set(cfg.get("NH3_ALLOWED_TAGS") or _DEFAULT_ALLOWED_TAGS)
+    attrs = {k: set(v) for k, v in (cfg.get("NH3_ALLOWED_ATTRS") or _DEFAULT_ALLOWED_ATTRS).items()}
+    payload = json.dumps(
+        [
+            getattr(md, "__version__", ""),
+            extensions,
+            sorted(tags),
+            sorted((k, sorted(v)) for k, v in attrs.items()),
+            sorted(_DEFAULT_ALLOWED_PROTOCOLS),
+        ],
+        ensure_ascii=False,
+    )
+    version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+    profile = (extensions, tags, attrs, version)
+    current_app.extensions["markdown_render_profile"] = (sources, profile)
+    return profile
+
+
+def markdown_render_settings() -> Tuple[list, set, dict]:
+    extensions, tags, attrs, _version = _render_profile()
+    return extensions, tags, attrs
+
+
+def markdown_renderer_version() -> str:
+    """
+    Отпечаток настроек рендера: меняется вместе с MARKDOWN_EXTENSIONS, allow-листами NH3
+    или версией библиотек — тогда сохранённый HTML считается устаревшим.
+    """
+    return _render_profile()[3]
 
-    extensions = current_app.config.get("MARKDOWN_EXTENSIONS", ["extra", "sane_lists", "nl2br"])
-    html = md.markdown(src_text, extensions=extensions)
 
-    allowed_tags = current_app.config.get("NH3_ALLOWED_TAGS") or _DEFAULT_ALLOWED_TAGS
-    allowed_attrs = current_app.config.get("NH3_ALLOWED_ATTRS") or _DEFAULT_ALLOWED_ATTRS
+def render_markdown(src_text: str, extensions: list, allowed_tags: set, allowed_attrs: dict) -> str:
+    if not src_text:
+        return ""
 
     try:
+        html = _markdown_engine(extensions).convert(src_text)
         return nh3.clean(
             html,
             tags=allowed_tags,
@@ -113,10 +325,57 @@ def markdown_to_html_safe(src_text: str) -> str:
         return str(escape(src_text)).replace("\n", "<br>")
 
 
+def markdown_to_html_safe(src_text: str) -> str:
+    if not src_text:
+        return ""
+
+    extensions, tags, attrs, version = _render_profile()
+    key = (hashlib.blake2b(src_text.encode("utf-8"), digest_size=16).digest(), version)
+    html = markdown_cache.get(key)
+    if html is None:
+        html = render_markdown(src_text, extensions, tags, attrs)
+        markdown_cache.put(key, html)
+    return html
+
+
+def render_markdown_for_storage(src_text: str) -> Tuple[str, str]:
+    """
+    HTML и версия рендера для записи в БД рядом с исходным Markdown.
+    """
+    return markdown_to_html_safe(src_text), markdown_renderer_version()
+
+
+def stored_markdown_html(src_text: Optional[str], html: Optional[str], version: Optional[str]) -> str:
+    if html is not None and version == markdown_renderer_version():
+        return html
+    return markdown_to_html_safe(src_text or "")
 
-def parse_page_arg(raw: Optional[str], default: int = 1) -> int:
+
+def parse_page_arg(raw: Optional[str], default: int = 1, maximum: Optional[int] = None) -> int:
     try:
         val = int(raw)
-        return val if val > 0 else default
+        val = val if val > 0 else default
     except (TypeError, ValueError):
-        return default
\ No newline at end of file
+        val = default
+    # Номер страницы превращается в OFFSET — без верхней границы ?page=100000 читает весь индекс.
+    return min(val, maximum) if maximum else val
+
+
+def encode_cursor(*values: int) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str], arity: int) -> Optional[Tuple[int, ...]]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != arity:
+        return None
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return None
+    return tuple(values)
@@ -0,0 +1,26 @@
+"""books (year, id) index for keyset pagination
+
+Revision ID: 085b6451e558
+Revises: c2ea1a0d00e3
+Create Date: 2026-10-17 11:03:17.224690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '085b6451e558'
+down_revision = 'c2ea1a0d00e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index('ix_books_year_id', ['year', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index('ix_books_year_id')
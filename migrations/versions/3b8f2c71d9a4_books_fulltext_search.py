@@ -0,0 +1,36 @@
+"""books fulltext search
+
+Revision ID: 3b8f2c71d9a4
+Revises: d7678032e34b
+Create Date: 2026-10-17 18:02:37.214906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8f2c71d9a4'
+down_revision = 'd7678032e34b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index(
+            'ft_books_search',
+            ['title', 'author', 'publisher', 'short_description'],
+            unique=False,
+            mysql_prefix='FULLTEXT',
+        )
+
+    data_versions = sa.table('data_versions', sa.column('name', sa.String), sa.column('version', sa.Integer))
+    op.bulk_insert(data_versions, [{'name': 'catalogue', 'version': 0}])
+
+
+def downgrade():
+    op.execute("DELETE FROM data_versions WHERE name = 'catalogue'")
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index('ft_books_search')
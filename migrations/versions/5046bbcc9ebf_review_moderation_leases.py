@@ -0,0 +1,35 @@
+"""review moderation leases
+
+Revision ID: 5046bbcc9ebf
+Revises: 9aa003329bb8
+Create Date: 2026-10-17 15:02:37.810442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5046bbcc9ebf'
+down_revision = '9aa003329bb8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_by_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('claim_expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_reviews_claimed_by', 'users', ['claimed_by_id'], ['id'],
+            onupdate='CASCADE', ondelete='SET NULL'
+        )
+        batch_op.create_index('ix_reviews_status_created', ['status_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_status_created')
+        batch_op.drop_constraint('fk_reviews_claimed_by', type_='foreignkey')
+        batch_op.drop_column('claim_expires_at')
+        batch_op.drop_column('claimed_by_id')
@@ -0,0 +1,38 @@
+"""rendered markdown columns
+
+Revision ID: 72ae577095d7
+Revises: 085b6451e558
+Create Date: 2026-10-17 12:26:54.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '72ae577095d7'
+down_revision = '085b6451e558'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('short_description_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('short_description_render_version', sa.String(length=16), nullable=True))
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('text_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('text_render_version', sa.String(length=16), nullable=True))
+
+    # HTML для существующих строк заполняется командой `flask markdown backfill`.
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_column('text_render_version')
+        batch_op.drop_column('text_html')
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_column('short_description_render_version')
+        batch_op.drop_column('short_description_html')
@@ -0,0 +1,32 @@
+"""data versions
+
+Revision ID: 9aa003329bb8
+Revises: 72ae577095d7
+Create Date: 2026-10-17 13:40:09.671532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9aa003329bb8'
+down_revision = '72ae577095d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_versions = op.create_table('data_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+        mysql_charset='utf8mb4',
+        mysql_collate='utf8mb4_unicode_ci',
+        mysql_engine='InnoDB'
+    )
+    op.bulk_insert(data_versions, [{'name': 'refdata', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('data_versions')
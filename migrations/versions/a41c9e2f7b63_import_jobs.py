@@ -0,0 +1,36 @@
+"""import jobs
+
+Revision ID: a41c9e2f7b63
+Revises: 3b8f2c71d9a4
+Create Date: 2026-10-17 21:14:52.608391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c9e2f7b63'
+down_revision = '3b8f2c71d9a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_jobs',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('source', sa.String(length=255), nullable=False),
+        sa.Column('position', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('imported', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('skipped', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+        mysql_charset='utf8mb4',
+        mysql_collate='utf8mb4_unicode_ci',
+        mysql_engine='InnoDB'
+    )
+
+
+def downgrade():
+    op.drop_table('import_jobs')
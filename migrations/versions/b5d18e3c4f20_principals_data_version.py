@@ -0,0 +1,25 @@
+"""principals data version
+
+Revision ID: b5d18e3c4f20
+Revises: a41c9e2f7b63
+Create Date: 2026-10-17 23:05:41.208716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d18e3c4f20'
+down_revision = 'a41c9e2f7b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_versions = sa.table('data_versions', sa.column('name', sa.String), sa.column('version', sa.Integer))
+    op.bulk_insert(data_versions, [{'name': 'principals', 'version': 1}])
+
+
+def downgrade():
+    op.execute("DELETE FROM data_versions WHERE name = 'principals'")
@@ -0,0 +1,48 @@
+"""book stats
+
+Revision ID: c2ea1a0d00e3
+Revises: e6514bdf951c
+Create Date: 2026-10-17 10:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2ea1a0d00e3'
+down_revision = 'e6514bdf951c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('book_stats',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('reviews_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('approved_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('approved_rating_sum', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], onupdate='CASCADE', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id'),
+        mysql_charset='utf8mb4',
+        mysql_collate='utf8mb4_unicode_ci',
+        mysql_engine='InnoDB'
+    )
+
+    op.execute(
+        """
+        INSERT INTO book_stats (book_id, reviews_count, approved_count, approved_rating_sum)
+        SELECT b.id,
+               COUNT(r.id),
+               COALESCE(SUM(CASE WHEN s.name = 'Одобрена' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN s.name = 'Одобрена' THEN r.rating ELSE 0 END), 0)
+        FROM books b
+        LEFT JOIN reviews r ON r.book_id = b.id
+        LEFT JOIN review_statuses s ON s.id = r.status_id
+        GROUP BY b.id
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('book_stats')
@@ -0,0 +1,28 @@
+"""books import key
+
+Revision ID: c83e0f5a9d17
+Revises: b5d18e3c4f20
+Create Date: 2026-10-17 23:41:17.530962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c83e0f5a9d17'
+down_revision = 'b5d18e3c4f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('import_key', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_books_import_key', ['import_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index('ix_books_import_key')
+        batch_op.drop_column('import_key')
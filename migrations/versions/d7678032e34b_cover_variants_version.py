@@ -0,0 +1,28 @@
+"""cover variants version
+
+Revision ID: d7678032e34b
+Revises: e264b46e4a39
+Create Date: 2026-10-17 16:31:05.552861
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7678032e34b'
+down_revision = 'e264b46e4a39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('covers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('variants_version', sa.Integer(), nullable=True))
+
+    # Варианты для существующих обложек: `flask covers variants`.
+
+
+def downgrade():
+    with op.batch_alter_table('covers', schema=None) as batch_op:
+        batch_op.drop_column('variants_version')
@@ -0,0 +1,28 @@
+"""reviews (book_id, status_id, created_at, id) index
+
+Revision ID: e264b46e4a39
+Revises: 5046bbcc9ebf
+Create Date: 2026-10-17 15:48:20.395127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e264b46e4a39'
+down_revision = '5046bbcc9ebf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_reviews_book_status_created', ['book_id', 'status_id', 'created_at', 'id'], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_book_status_created')
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import itertools
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config  # noqa: E402
+from elib import create_app, db  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path) -> Callable:
+    """Фабрика приложений на SQLite во временном каталоге; ``overrides`` — поля конфигурации."""
+
+    apps = itertools.count()
+
+    def factory(**overrides):
+        root = tmp_path / f"app{next(apps)}"
+        root.mkdir()
+        attrs = {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{root / 'elib.db'}",
+            "COVERS_DIR": str(root / "covers"),
+            "SQLALCHEMY_REPLICA_URLS": [],
+            "TESTING": True,
+            **overrides,
+        }
+        app = create_app(type("TestConfig", (Config,), attrs))
+        with app.app_context():
+            # Только основная БД: реплики — копии, а не отдельные схемы.
+            db.create_all(bind_key=None)
+        return app
+
+    return factory
+
+
+@contextmanager
+def count_statements(engine: Engine) -> Iterator[List[str]]:
+    """Все SQL-выражения, выполненные на ``engine`` внутри блока."""
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import json
+
+from PIL import Image
+from sqlalchemy import func, select
+
+from bench.dataset import DatasetSize, generate
+from elib import db
+from elib.bulk_import import import_catalogue, import_key
+from elib.models import Book, BookGenre, BookStats
+
+
+def test_imported_rows_are_mapped_to_their_book_ids(make_app, tmp_path):
+    app = make_app()
+    source = tmp_path / "manifest"
+    source.mkdir()
+    lines = []
+    for i in range(12):
+        Image.new("RGB", (30, 40), (i * 20, 0, 0)).save(source / f"{i}.png")
+        genres = [str(i % 4 + 1)] if i % 3 else []
+        lines.append(json.dumps({
+            "title": f"Импорт {i}", "author": f"Автор {i}", "publisher": "Издательство",
+            "year": 1900 + i, "pages": 100 + i, "genres": genres, "cover": f"{i}.png",
+        }))
+    lines.insert(5, "{не json")
+    manifest = source / "books.jsonl"
+    manifest.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    with app.app_context():
+        generate(DatasetSize(books=5, reviews=0, users=3, genres=4))
+        result = import_catalogue(manifest, source, key="job1", fmt="jsonl", batch_size=4, workers=1)
+        assert (result.job.imported, result.job.skipped) == (12, 1)
+
+        for line_no, line in enumerate(lines, start=1):
+            if line.startswith("{не"):
+                continue
+            row = json.loads(line)
+            book = db.session.scalar(select(Book).where(Book.import_key == import_key("job1", line_no)))
+            assert (book.title, book.year, book.pages) == (row["title"], row["year"], row["pages"])
+            genre_ids = db.session.scalars(select(BookGenre.genre_id).where(BookGenre.book_id == book.id)).all()
+            assert [str(g) for g in genre_ids] == row["genres"]
+            assert db.session.get(BookStats, book.id) is not None
+
+        assert db.session.scalar(select(func.count()).select_from(Book)) == 5 + 12
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from sqlalchemy import insert
+
+from elib import catalogue, db
+from elib.catalogue import bump_catalogue_version, rebuild_indexes
+from elib.models import Book, Cover
+
+from conftest import count_statements
+
+BOOKS = 20
+
+
+def _add_books(first: int, count: int) -> None:
+    ids = range(first, first + count)
+    db.session.execute(
+        insert(Cover), [{"id": i, "filename": f"{i}.jpg", "mime_type": "image/jpeg", "md5": f"{i:032x}"} for i in ids]
+    )
+    db.session.execute(
+        insert(Book),
+        [
+            {
+                "id": i, "title": f"Летопись {i}", "short_description": "Описание", "year": 1950 + i,
+                "publisher": "Издательство", "author": f"Автор {i}", "pages": 100, "cover_id": i,
+            }
+            for i in ids
+        ],
+    )
+    # Как будто каталог поменял другой процесс: версия растёт, books_changed не вызывается.
+    bump_catalogue_version()
+    db.session.commit()
+
+
+def test_indexes_share_one_catalogue_load(make_app):
+    app = make_app()
+    with app.app_context():
+        _add_books(1, BOOKS)
+        with count_statements(db.engine) as statements:
+            rebuild_indexes()
+    loads = [s for s in statements if s.lstrip().upper().startswith("SELECT BOOKS.ID, BOOKS.TITLE")]
+    assert len(loads) == 1
+
+
+def test_stale_snapshot_is_served_until_background_rebuild_swaps(make_app):
+    app = make_app(CATALOGUE_CHECK_INTERVAL=0)
+    with app.app_context():
+        _add_books(1, BOOKS)
+    client = app.test_client()
+    assert "Найдено книг: 20" in client.get("/?q=Летопись").get_data(as_text=True)
+
+    with app.app_context():
+        _add_books(BOOKS + 1, 5)
+    # Запрос не ждёт перестройки: отвечает прежний снимок.
+    assert "Найдено книг: 20" in client.get("/?q=Летопись").get_data(as_text=True)
+
+    catalogue._rebuild_thread.join(timeout=10)
+    assert "Найдено книг: 25" in client.get("/?q=Летопись").get_data(as_text=True)
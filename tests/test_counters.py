@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from elib.counters import CounterCache
+
+
+def test_value_loaded_during_a_change_is_not_cached():
+    cache = CounterCache(ttl=60)
+    cache.get("books", lambda: 10)
+    cache.invalidate("books")
+
+    def loader():
+        # Пока считаем, другой запрос закоммитил новую книгу.
+        cache.incr("books", 1)
+        return 10
+
+    assert cache.get("books", loader) == 10
+    assert cache.get("books", lambda: 11) == 11
+    cache.incr("books", 1)
+    assert cache.get("books", lambda: 0) == 12
+
+
+def test_group_invalidation_during_load_skips_store():
+    cache = CounterCache(ttl=60)
+
+    def loader():
+        cache.invalidate_group("reviews_by_status")
+        return 3
+
+    assert cache.get(("reviews_by_status", 1), loader) == 3
+    assert cache.get(("reviews_by_status", 1), lambda: 4) == 4
+
+
+def test_unchanged_load_is_cached():
+    cache = CounterCache(ttl=60)
+    assert cache.get("books", lambda: 5) == 5
+    assert cache.get("books", lambda: 99) == 5
+    assert cache.hits == 1 and cache.misses == 1
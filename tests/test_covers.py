@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from PIL import Image
+from sqlalchemy import insert, select
+
+from elib import db
+from elib.covers import schedule_cover_variants
+from elib.models import Cover
+from elib.thumbnails import VARIANTS_VERSION, variant_filenames
+
+
+def _variants_version(cover_id):
+    db.session.rollback()
+    return db.session.scalar(select(Cover.variants_version).where(Cover.id == cover_id))
+
+
+def test_variants_are_rendered_after_commit_without_blocking(make_app):
+    app = make_app()
+    with app.app_context():
+        covers_dir = Path(app.config["COVERS_DIR"])
+        covers_dir.mkdir(parents=True, exist_ok=True)
+        src_path = covers_dir / "1.jpg"
+        Image.new("RGB", (600, 800), "teal").save(src_path)
+        db.session.execute(insert(Cover).values(id=1, filename="1.jpg", mime_type="image/jpeg", md5="0" * 32))
+
+        schedule_cover_variants(db.session, 1, "1.jpg", src_path)
+        db.session.commit()
+        # commit не ждёт ресайза: версия проставляется позже, из колбэка пула.
+        assert _variants_version(1) is None
+
+        deadline = time.monotonic() + 30
+        while _variants_version(1) is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert _variants_version(1) == VARIANTS_VERSION
+        assert all((covers_dir / name).is_file() for name in variant_filenames("1.jpg", 1))
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import insert
+
+from elib import db
+from elib.models import Book, BookGenre, BookStats, Cover, Genre
+
+from conftest import count_statements
+
+BOOKS = 30
+GENRES = 6
+
+
+def _seed(genres_per_book: int) -> None:
+    db.session.execute(insert(Genre), [{"id": i, "name": f"Жанр {i}"} for i in range(1, GENRES + 1)])
+    db.session.execute(
+        insert(Cover),
+        [{"id": i, "filename": f"{i}.jpg", "mime_type": "image/jpeg", "md5": f"{i:032x}"} for i in range(1, BOOKS + 1)],
+    )
+    db.session.execute(
+        insert(Book),
+        [
+            {
+                "id": i, "title": f"Книга {i}", "short_description": "Описание", "year": 1950 + i,
+                "publisher": "Издательство", "author": f"Автор {i}", "pages": 100, "cover_id": i,
+            }
+            for i in range(1, BOOKS + 1)
+        ],
+    )
+    db.session.execute(
+        insert(BookGenre),
+        [
+            {"book_id": i, "genre_id": (i + k) % GENRES + 1}
+            for i in range(1, BOOKS + 1)
+            for k in range(genres_per_book)
+        ],
+    )
+    db.session.execute(
+        insert(BookStats),
+        [{"book_id": i, "reviews_count": 0, "approved_count": 0, "approved_rating_sum": 0} for i in range(1, BOOKS + 1)],
+    )
+    db.session.commit()
+
+
+def _index_statements(make_app, page_size: int, genres_per_book: int, url: str = "/") -> int:
+    app = make_app(PAGE_SIZE=page_size)
+    with app.app_context():
+        _seed(genres_per_book)
+        engine = db.engine
+    client = app.test_client()
+    # Первый запрос прогревает справочники и счётчики — считаем второй.
+    assert client.get(url).status_code == 200
+    with count_statements(engine) as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("url", ["/", "/?page=2", "/?genre=1&year_from=1960"])
+def test_index_statement_count_does_not_grow_with_page(make_app, url):
+    small = _index_statements(make_app, page_size=2, genres_per_book=1, url=url)
+    large = _index_statements(make_app, page_size=10, genres_per_book=GENRES - 1, url=url)
+    assert small == large
+
+
+def test_index_is_loaded_in_two_phases(make_app):
+    # id страницы, книги, обложки, связи книга–жанр, жанры — без запроса на каждую книгу.
+    assert _index_statements(make_app, page_size=10, genres_per_book=3) <= 5
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from sqlalchemy import delete, select
+
+from bench.dataset import DatasetSize, generate
+from elib import db
+from elib.models import DataVersion, User
+
+
+def _version():
+    return db.session.scalar(select(DataVersion.version).where(DataVersion.name == DataVersion.PRINCIPALS))
+
+
+def _rename(username, first_name):
+    user = db.session.scalar(select(User).where(User.username == username))
+    user.first_name = first_name
+    db.session.commit()
+
+
+def test_user_change_bumps_principals_version(make_app):
+    app = make_app()
+    with app.app_context():
+        generate(DatasetSize(books=2, reviews=0, users=4, genres=2))
+        before = _version()
+        _rename("user3", "Иван")
+        assert _version() == before + 1
+
+
+def test_missing_principals_row_is_created(make_app):
+    app = make_app()
+    with app.app_context():
+        generate(DatasetSize(books=2, reviews=0, users=4, genres=2))
+        db.session.execute(delete(DataVersion).where(DataVersion.name == DataVersion.PRINCIPALS))
+        db.session.commit()
+
+        _rename("user3", "Иван")
+        assert _version() == 1
+        _rename("user3", "Пётр")
+        assert _version() == 2
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import shutil
+from contextlib import ExitStack
+
+import pytest
+from sqlalchemy import select
+
+from bench.dataset import PASSWORD, DatasetSize, generate
+from elib import db
+from elib.models import Book, Review, User
+
+from conftest import count_statements
+
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+@pytest.fixture
+def routed_app(make_app, tmp_path):
+    """Приложение с основной БД и двумя репликами — копиями основной (SQLite-файлы)."""
+    seed_app = make_app()
+    with seed_app.app_context():
+        generate(DatasetSize(books=30, reviews=60, users=6, genres=4))
+        primary_path = db.engine.url.database
+        db.engine.dispose()
+
+    replica_urls = []
+    for i in range(2):
+        path = tmp_path / f"replica{i}.db"
+        shutil.copyfile(primary_path, path)
+        replica_urls.append(f"sqlite:///{path}")
+
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{primary_path}", SQLALCHEMY_REPLICA_URLS=replica_urls)
+    with app.app_context():
+        engines = {"primary": db.engine, "replica_0": db.engines["replica_0"], "replica_1": db.engines["replica_1"]}
+    return app, engines
+
+
+def _run(engines, fn):
+    """Результат ``fn()`` и выражения, выполненные за это время на каждом engine."""
+    with ExitStack() as stack:
+        statements = {name: stack.enter_context(count_statements(engine)) for name, engine in engines.items()}
+        result = fn()
+    return result, statements
+
+
+def _login(app, username):
+    client = app.test_client()
+    assert client.post("/login", data={"username": username, "password": PASSWORD}).status_code == 302
+    return client
+
+
+def test_get_views_read_from_a_single_replica(routed_app):
+    app, engines = routed_app
+    client = app.test_client()
+    client.get("/")  # прогрев справочников и индексов
+
+    for _ in range(4):
+        response, statements = _run(engines, lambda: client.get("/?page=2"))
+        assert response.status_code == 200
+        assert not statements["primary"]
+        used = [name for name in ("replica_0", "replica_1") if statements[name]]
+        # Все SELECT'ы одного запроса — с одной реплики.
+        assert len(used) == 1
+        assert all(s.lstrip().upper().startswith("SELECT") for s in statements[used[0]])
+
+
+def test_writes_go_to_primary_and_pin_the_client_to_it(routed_app):
+    app, engines = routed_app
+    with app.app_context():
+        user_id = db.session.scalar(select(User.id).where(User.username == "user3"))
+        book_id = db.session.scalar(
+            select(Book.id).where(~select(Review.id).where(Review.book_id == Book.id, Review.user_id == user_id).exists())
+        )
+    client = _login(app, "user3")
+
+    response, statements = _run(
+        engines, lambda: client.post(f"/books/{book_id}/reviews", data={"rating": "4", "text": "Хорошая книга."})
+    )
+    assert response.status_code == 302
+    assert any(s.lstrip().upper().startswith(WRITES) for s in statements["primary"])
+    for name in ("replica_0", "replica_1"):
+        assert not statements[name]
+
+    # Сразу после записи клиент читает с основной БД и видит свою рецензию.
+    response, statements = _run(engines, lambda: client.get("/my/reviews"))
+    assert response.status_code == 200
+    assert "Хорошая книга." in response.get_data(as_text=True)
+    assert statements["primary"]
+    assert not statements["replica_0"] and not statements["replica_1"]
+
+
+def test_counters_are_loaded_from_primary(routed_app):
+    app, engines = routed_app
+    client = app.test_client()
+    client.get("/")  # прогрев справочников и индексов
+    with app.app_context():
+        from elib.counters import counters
+
+        counters.clear()
+
+    response, statements = _run(engines, lambda: client.get("/"))
+    assert response.status_code == 200
+    # На основную БД уходит только подсчёт книг для пагинации, остальное — с реплики.
+    assert any("count(" in s.lower() for s in statements["primary"])
+    assert not any("count(" in s.lower() for name in ("replica_0", "replica_1") for s in statements[name])
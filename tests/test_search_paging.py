@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from sqlalchemy import insert
+
+from elib import db
+from elib.models import Book, Cover
+
+BOOKS = 230
+
+
+def _seed() -> None:
+    db.session.execute(
+        insert(Cover),
+        [{"id": i, "filename": f"{i}.jpg", "mime_type": "image/jpeg", "md5": f"{i:032x}"} for i in range(1, BOOKS + 1)],
+    )
+    db.session.execute(
+        insert(Book),
+        [
+            {
+                "id": i, "title": f"Хроника {i}", "short_description": "Описание", "year": 1900 + i % 100,
+                "publisher": "Издательство", "author": f"Автор {i}", "pages": 100, "cover_id": i,
+            }
+            for i in range(1, BOOKS + 1)
+        ],
+    )
+    db.session.commit()
+
+
+def test_search_pagination_stops_at_the_numbered_pages(make_app):
+    app = make_app(PAGE_SIZE=10, MAX_NUMBERED_PAGES=20)
+    with app.app_context():
+        _seed()
+    client = app.test_client()
+
+    html = client.get("/?q=Хроника").get_data(as_text=True)
+    assert "Найдено книг: 230, показаны первые 200" in html
+    assert "page=20" in html and "page=21" not in html and "page=23" not in html
+
+    response = client.get("/?q=Хроника&page=20")
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert html.count("Хроника ") == 10
+    # Последняя доступная страница — «›» неактивна.
+    assert '<span class="page-link">›</span>' in html